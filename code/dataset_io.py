@@ -0,0 +1,292 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Supported output formats and the file extension each one writes
+OUTPUT_FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+
+
+def _import_pyarrow():
+    """Import pyarrow lazily, it is only needed for Parquet files"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Parquet output needs pyarrow, install it with `pip install pyarrow`") from error
+    return pa, pq
+
+
+def output_path(stem, output_format='csv'):
+    """File path for a dataset stem such as 'data/evago_google_ads_data'"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {sorted(OUTPUT_FORMATS)}")
+    return stem + OUTPUT_FORMATS[output_format]
+
+
+def generated_format(state_path):
+    """Output format recorded in a simulator's generation state, None when there is no state"""
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f).get('output_format')
+
+
+def input_path(stem, input_format=None):
+    """Existing file of a generated dataset stem, in the given format
+
+    Without a format the newest copy is used, CSV when there is none. A copy
+    in another format that is newer than the chosen one was most likely
+    written by a later run, so it raises ValueError rather than reading
+    stale data.
+    """
+    copies = {fmt: output_path(stem, fmt) for fmt in OUTPUT_FORMATS}
+    existing = {fmt: os.path.getmtime(path) for fmt, path in copies.items() if os.path.exists(path)}
+    if input_format is None:
+        input_format = max(existing, key=existing.get) if existing else 'csv'
+    path = output_path(stem, input_format)
+    newer = [copies[fmt] for fmt, mtime in existing.items() if mtime > existing.get(input_format, mtime)]
+    if newer:
+        raise ValueError(f"{', '.join(newer)} is newer than {path}, remove the stale copy or choose its input format")
+    return path
+
+
+class CsvDatasetWriter:
+    """Append DataFrame chunks to one CSV file, writing the header only once"""
+
+    def __init__(self, path, header=True):
+        self.path = path
+        self.rows = 0
+        self._header = header
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+
+    def write(self, df):
+        """Append one chunk to the file"""
+        df.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+        self.rows += len(df)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetDatasetWriter:
+    """Append DataFrame chunks as row groups of one zstd-compressed Parquet file
+
+    String columns are stored dictionary-encoded and datetimes as typed
+    millisecond timestamps. The schema is fixed by the first chunk.
+    """
+
+    def __init__(self, path, header=True):
+        # header is accepted for interface parity with CsvDatasetWriter
+        self.path = path
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def _arrow_schema(self, table):
+        """Dictionary-encode strings and use millisecond timestamps"""
+        pa, _ = _import_pyarrow()
+        fields = []
+        for field in table.schema:
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+            elif pa.types.is_dictionary(field.type):
+                field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+            elif pa.types.is_timestamp(field.type):
+                field = field.with_type(pa.timestamp('ms'))
+            fields.append(field)
+        return pa.schema(fields)
+
+    def write(self, df):
+        """Append one chunk to the file as a row group"""
+        pa, pq = _import_pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = self._arrow_schema(table)
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression='zstd')
+        self._writer.write_table(table.cast(self._schema))
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+WRITERS = {'csv': CsvDatasetWriter, 'parquet': ParquetDatasetWriter}
+
+
+def dataset_writer(path, output_format='csv', header=True):
+    """Open a chunk writer for the given output format"""
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {sorted(WRITERS)}")
+    return WRITERS[output_format](path, header)
+
+
+def write_dataset(df, path, output_format='csv'):
+    """Write a whole DataFrame in the given output format"""
+    with dataset_writer(path, output_format) as writer:
+        writer.write(df)
+
+
+def merge_parts(path, part_paths, output_format='csv', append=False):
+    """Concatenate shard files, in order, into the final output file
+
+    With append the parts are added after the rows already in path.
+    """
+    if output_format == 'parquet':
+        _, pq = _import_pyarrow()
+        # Parquet files cannot be extended in place, so appending rewrites the row groups into a new file
+        sources = ([path] if append else []) + list(part_paths)
+        target = f'{path}.merge' if append else path
+        writer = None
+        for source in sources:
+            part = pq.ParquetFile(source)
+            if writer is None:
+                writer = pq.ParquetWriter(target, part.schema_arrow, compression='zstd')
+            for row_group in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(row_group))
+        if writer is not None:
+            writer.close()
+        if append:
+            os.replace(target, path)
+        for part_path in part_paths:
+            os.remove(part_path)
+        return
+
+    with open(path, 'ab' if append else 'wb') as output:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, output)
+            os.remove(part_path)
+
+
+def _arrow_type(pa, dtype):
+    """pyarrow type a CSV column is parsed into for a schema dtype"""
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == 'datetime':
+        return pa.timestamp('s')
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def _read_csv_typed(path, schema):
+    """Read the schema's columns of a CSV file, with pyarrow's parser when it is installed"""
+    try:
+        pa, _ = _import_pyarrow()
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        dates = [column for column, dtype in schema.items() if dtype == 'datetime']
+        dtypes = {column: dtype for column, dtype in schema.items() if dtype != 'datetime'}
+        return pd.read_csv(path, usecols=list(schema), dtype=dtypes, parse_dates=dates)
+
+    # Parsing straight into the final types skips pandas' inference and conversion passes
+    options = pa_csv.ConvertOptions(
+        include_columns=list(schema),
+        column_types={column: _arrow_type(pa, dtype) for column, dtype in schema.items()}
+    )
+    return pa_csv.read_csv(path, convert_options=options).to_pandas()
+
+
+def _sorted_categories(df):
+    """Order every categorical's categories like the strings sort, so it groups like read_csv's object columns"""
+    for column in df.select_dtypes('category').columns:
+        categories = df[column].cat.categories
+        if not categories.is_monotonic_increasing:
+            df[column] = df[column].cat.reorder_categories(categories.sort_values())
+    return df
+
+
+def _csv_chunks_typed(path, schema, chunk_rows):
+    """Stream the schema's columns of a CSV file as frames of chunk_rows rows"""
+    try:
+        pa, _ = _import_pyarrow()
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        dates = [column for column, dtype in schema.items() if dtype == 'datetime']
+        dtypes = {column: dtype for column, dtype in schema.items() if dtype != 'datetime'}
+        yield from pd.read_csv(path, usecols=list(schema), dtype=dtypes, parse_dates=dates, chunksize=chunk_rows)
+        return
+
+    options = pa_csv.ConvertOptions(
+        include_columns=list(schema),
+        column_types={column: _arrow_type(pa, dtype) for column, dtype in schema.items()}
+    )
+    # The reader yields blocks of about a megabyte, which are cut and joined into fixed-size chunks
+    pending = []
+    rows = 0
+    for batch in pa_csv.open_csv(path, convert_options=options):
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_rows).to_pandas()
+            rest = table.slice(chunk_rows)
+            pending = rest.to_batches()
+            rows = rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def iter_dataset(path, schema, chunk_rows):
+    """Read a CSV or Parquet dataset as a sequence of typed frames of chunk_rows rows
+
+    Columns and dtypes are those read_dataset gives for the schema, but the
+    categories of each chunk are only the values in that chunk. Only one
+    chunk is in memory at a time. An empty file gives one empty chunk.
+    """
+    if path.endswith(OUTPUT_FORMATS['parquet']):
+        _, pq = _import_pyarrow()
+        dtypes = {column: dtype for column, dtype in schema.items() if dtype != 'datetime'}
+        chunks = (
+            batch.to_pandas().astype(dtypes)
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=list(schema))
+        )
+    else:
+        chunks = _csv_chunks_typed(path, schema, chunk_rows)
+    empty = True
+    for chunk in chunks:
+        empty = False
+        yield _sorted_categories(chunk[list(schema)])
+    if empty:
+        yield read_dataset(path, schema)
+
+
+def read_dataset(path, schema=None, **kwargs):
+    """Read a CSV or Parquet dataset, picking the reader from the file extension
+
+    schema maps the columns to read to their dtypes, with 'datetime' for
+    dates; the other columns are skipped and no dtype is inferred. CSV files
+    are parsed by pyarrow when it is installed. Categorical columns come
+    back with sorted categories, so they group and sort like plain strings.
+
+    Without a schema every column is read. Dictionary-encoded Parquet
+    columns then come back as plain strings, so the frame groups and sorts
+    exactly like the one read_csv returns.
+    """
+    if schema is not None:
+        if path.endswith(OUTPUT_FORMATS['parquet']):
+            dtypes = {column: dtype for column, dtype in schema.items() if dtype != 'datetime'}
+            df = pd.read_parquet(path, columns=list(schema), **kwargs).astype(dtypes)
+        else:
+            df = _read_csv_typed(path, schema)
+        return _sorted_categories(df[list(schema)])
+
+    if path.endswith(OUTPUT_FORMATS['parquet']):
+        df = pd.read_parquet(path, **kwargs)
+        return df.astype({column: str for column in df.select_dtypes('category').columns})
+    return pd.read_csv(path, **kwargs)
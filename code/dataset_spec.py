@@ -0,0 +1,248 @@
+import pandas as pd
+import numpy as np
+
+from simulation_utils import cartesian_index, truncate, safe_divide, compact_frame
+
+# Functions every spec expression can use, next to the dataset's own columns
+EXPRESSION_FUNCTIONS = {
+    'np': np,
+    'where': np.where,
+    'maximum': np.maximum,
+    'minimum': np.minimum,
+    'isin': np.isin,
+    'sin': np.sin,
+    'pi': np.pi,
+    'truncate': truncate,
+    'safe_divide': safe_divide
+}
+
+
+def boost(when, **multipliers):
+    """Spec step multiplying columns wherever `when` holds
+
+    e.g. boost('is_mojo_campaign & since(mojo_acquisition_date)', revenue=1.2).
+    Integer columns are truncated after the multiplication.
+    """
+    return {'boost': multipliers, 'when': when}
+
+
+def latent(column, model, source, by=()):
+    """Spec step reading a column of a shared latent model
+
+    The model's `source` column is summed over the dates and `by` columns and
+    joined onto the dataset's rows, e.g. latent('sessions', 'traffic',
+    'sessions', by=('country',)) gives every row its country's daily sessions.
+    """
+    return {'latent': column, 'model': model, 'source': source, 'by': tuple(by)}
+
+
+def split(column, total, weights='1', by=(), capped=False):
+    """Spec step splitting a total across rows with one multinomial draw
+
+    Rows sharing a date and the `by` columns share the integer `total`
+    expression and get parts of it in proportion to `weights`, so they add
+    up to it exactly, e.g. a country's sessions split across devices.
+
+    With capped set the weights are whole-number counts and the total is
+    drawn out of them without replacement (a multivariate hypergeometric
+    draw), so no row gets more than its count, e.g. a campaign's
+    conversions split across its ad groups' clicks.
+    """
+    return {'split': column, 'total': total, 'weights': weights, 'by': tuple(by), 'capped': capped}
+
+
+def rank(column, weights='1', by=(), positions=None):
+    """Spec step drawing one ranking per date and `by` group
+
+    The rows of a group get distinct positions out of 1..positions (the
+    group size by default), rows with larger `weights` tending to rank
+    higher, e.g. every competitor's SERP position for a keyword.
+    """
+    return {'rank': column, 'weights': weights, 'by': tuple(by), 'positions': positions}
+
+
+class ExpressionNamespace(dict):
+    """Columns visible to spec expressions, with calendar columns derived on first use"""
+
+    CALENDAR = {
+        'weekday': lambda date: date.dt.weekday.to_numpy(),
+        'month': lambda date: date.dt.month.to_numpy(),
+        'day_of_year': lambda date: date.dt.dayofyear.to_numpy()
+    }
+
+    def __missing__(self, key):
+        if key not in self.CALENDAR:
+            raise KeyError(key)
+        value = self[key] = self.CALENDAR[key](self['date'])
+        return value
+
+
+class DatasetKernel:
+    """A dataset spec compiled into a vectorized generate(dates) function
+
+    A spec is plain data:
+
+    - 'dimensions': (column, values) pairs crossed with the dates, as for
+      cartesian_index. Numeric columns of a multi-column dimension work as
+      per-value attributes (e.g. a platform's reach range); columns starting
+      with '_' are not output.
+    - 'columns': steps evaluated in order. A (column, expression) pair sets a
+      column from a Python expression over earlier columns; uniform(low, high),
+      integers(low, high) and binomial(n, p) draw from the dataset's per-day
+      random streams, since(day) and days_since(day) compare with the date.
+      boost(), latent(), split() and rank() build the other step kinds.
+    - 'output' (optional): output columns in order. By default the date,
+      the dimensions and then every column step, skipping names that start
+      with '_'.
+    - 'params' (optional): constants the expressions can use.
+
+    latent() steps read the latent models the kernel was given, which are
+    kernels of their own that are not output. A latent model is generated
+    once per date slice and process and shared by every dataset reading it,
+    so their totals agree. split() and rank() then break such totals down
+    or order rows within groups.
+
+    Random values are drawn in step order, so changing the order of draws
+    changes the generated data.
+    """
+
+    # Latent model frames kept per date slice, enough for a year of monthly chunks
+    CACHE_SIZE = 16
+
+    def __init__(self, name, spec, random_streams, categories=None, float_dtype=np.float64, params=None, models=None):
+        self.name = name
+        self.spec = spec
+        self.random_streams = random_streams
+        self.categories = categories
+        self.float_dtype = float_dtype
+        self.params = {**(params or {}), **spec.get('params', {})}
+        self.models = models or {}
+        self._steps = None
+        self._cache = {}
+
+    def __getstate__(self):
+        # Code objects cannot be pickled, worker processes compile their own copy
+        state = self.__dict__.copy()
+        state['_steps'] = None
+        state['_cache'] = {}
+        return state
+
+    def _compile(self, expression, label):
+        return compile(expression, f'<{self.name}.{label}>', 'eval')
+
+    def compile(self):
+        """Compile every step expression once"""
+        steps = []
+        for step in self.spec['columns']:
+            if isinstance(step, tuple):
+                column, expression = step
+                steps.append(('column', column, self._compile(expression, column)))
+            elif 'boost' in step:
+                multipliers = {
+                    column: self._compile(factor, column) if isinstance(factor, str) else factor
+                    for column, factor in step['boost'].items()
+                }
+                steps.append(('boost', multipliers, self._compile(step['when'], 'boost')))
+            elif 'latent' in step:
+                if step['model'] not in self.models:
+                    raise ValueError(f"The {self.name} spec reads unknown latent model {step['model']!r}")
+                steps.append(('latent', step['latent'], (step['model'], step['source'], step['by'])))
+            elif 'split' in step:
+                column = step['split']
+                code = (
+                    self._compile(step['total'], column), self._compile(step['weights'], column), step['by'],
+                    step.get('capped', False)
+                )
+                steps.append(('split', column, code))
+            elif 'rank' in step:
+                column = step['rank']
+                steps.append(('rank', column, (self._compile(step['weights'], column), step['by'], step['positions'])))
+            else:
+                raise ValueError(f"Unknown step in the {self.name} spec: {step!r}")
+        self._steps = steps
+        return steps
+
+    def namespace(self, index, sample):
+        """Expression namespace over an index frame and its sampler"""
+        namespace = ExpressionNamespace(self.params)
+        for column in index.columns:
+            values = index[column]
+            # Categorical columns stay Series so .str and .isin work on the categories
+            namespace[column] = values if isinstance(values.dtype, pd.CategoricalDtype) or column == 'date' else values.to_numpy()
+        date = index['date']
+        namespace.update({
+            'uniform': sample.uniform,
+            'integers': sample.integers,
+            'binomial': sample.binomial,
+            'since': lambda day: (date >= pd.Timestamp(day)).to_numpy(),
+            'days_since': lambda day: (date - pd.Timestamp(day)).dt.days.to_numpy()
+        })
+        return namespace
+
+    def cached(self, dates):
+        """generate(dates), kept for later calls with the same date slice"""
+        dates = pd.DatetimeIndex(dates)
+        key = (dates[0], dates[-1], len(dates)) if len(dates) else None
+        if key not in self._cache:
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = self(dates)
+        return self._cache[key]
+
+    def latent_values(self, index, model, source, by):
+        """A latent model column summed to the index's dates and `by` columns, one value per row"""
+        keys = ['date', *by]
+        frame = self.models[model].cached(pd.DatetimeIndex(index['date'].unique()))
+        totals = frame.groupby(keys, observed=True, sort=False)[source].sum().rename('_value').reset_index()
+        values = index[keys].merge(totals, on=keys, how='left')['_value']
+        return values.fillna(0).to_numpy()
+
+    def day_groups(self, index, by, sample):
+        """Group code of each row of one day, grouping by the `by` columns"""
+        if not by:
+            return np.zeros(sample.rows_per_day, dtype=np.int64)
+        return index.groupby(list(by), observed=True, sort=False).ngroup().to_numpy()[:sample.rows_per_day]
+
+    def __call__(self, dates):
+        steps = self._steps or self.compile()
+        dimensions = self.spec.get('dimensions', [])
+        index = cartesian_index(dates, *dimensions, categories=self.categories)
+        sample = self.random_streams.sampler(self.name, index)
+        namespace = self.namespace(index, sample)
+        computed = []
+
+        for kind, target, code in steps:
+            if kind == 'column':
+                namespace[target] = eval(code, EXPRESSION_FUNCTIONS, namespace)
+                computed.append(target)
+            elif kind == 'boost':
+                mask = np.asarray(eval(code, EXPRESSION_FUNCTIONS, namespace), dtype=bool)
+                for column, factor in target.items():
+                    if not isinstance(factor, (int, float)):
+                        factor = eval(factor, EXPRESSION_FUNCTIONS, namespace)
+                    values = np.asarray(namespace[column])
+                    boosted = values * factor
+                    if np.issubdtype(values.dtype, np.integer):
+                        boosted = truncate(boosted)
+                    namespace[column] = np.where(mask, boosted, values)
+            elif kind == 'latent':
+                namespace[target] = self.latent_values(index, *code)
+                computed.append(target)
+            elif kind == 'split':
+                total, weights, by, capped = code
+                totals = eval(total, EXPRESSION_FUNCTIONS, namespace)
+                weights = eval(weights, EXPRESSION_FUNCTIONS, namespace)
+                draw = sample.hypergeometric if capped else sample.multinomial
+                namespace[target] = draw(totals, weights, self.day_groups(index, by, sample))
+                computed.append(target)
+            else:
+                weights, by, positions = code
+                weights = eval(weights, EXPRESSION_FUNCTIONS, namespace)
+                namespace[target] = sample.ranks(weights, self.day_groups(index, by, sample), positions)
+                computed.append(target)
+
+        output = self.spec.get('output') or [
+            column for column in [*index.columns, *dict.fromkeys(computed)] if not column.startswith('_')
+        ]
+        data = pd.DataFrame({column: namespace[column] for column in output}, index=index.index)
+        return compact_frame(data, self.categories, self.float_dtype)
@@ -1,15 +1,16 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import random
-import json
-import os
+from datetime import datetime
 
-class EvagoFlexiblePartnerSimulator:
-    def __init__(self):
-        self.start_date = datetime(2023, 1, 1)
-        self.end_date = datetime(2024, 12, 31)
-        self.date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='D')
+from simulation_utils import scaled_values, shared_categories
+from spec_simulator import SpecSimulator, spec_method
+
+class EvagoFlexiblePartnerSimulator(SpecSimulator):
+    summary_file = 'evago_flexible_data_summary.json'
+    state_file = 'evago_flexible_generation_state.json'
+    generation_message = "Generating comprehensive EVAGO data with flexible partner integration..."
+    
+    def __init__(self, seed=None, scale_factor=1, float32=False, end_date=None):
+        # Date range, dtypes and random streams, see SpecSimulator.setup_simulation
+        dimension_factor = self.setup_simulation(seed, scale_factor, float32, end_date)
         
         # EVAGO's actual global presence
         self.locations = {
@@ -93,164 +94,130 @@ class EvagoFlexiblePartnerSimulator:
             'EVAGO-Partner Partnership', 'Unified Rental Solutions'
         ]
         
+        # Synthetic cities, campaigns and keyword variants for larger scale factors
+        for info in self.locations.values():
+            info['cities'] = scaled_values(info['cities'], dimension_factor)
+        self.campaigns = scaled_values(self.campaigns, dimension_factor)
+        self.keywords = {lang: scaled_values(keywords, dimension_factor) for lang, keywords in self.keywords.items()}
+        
         # Flexible partner integration date (can be customized)
         self.partner_integration_date = datetime(2023, 6, 1)
         
+        # Fixed category sets, shared by every dataset that has the column
+        self.categories = shared_categories({
+            'country': list(self.locations),
+            'city': [city for info in self.locations.values() for city in info['cities']],
+            'location_type': [info['type'] for info in self.locations.values()],
+            'keyword': [keyword for keywords in self.keywords.values() for keyword in keywords],
+            'language': list(self.keywords),
+            'partner': [partner for info in self.locations.values() for partner in info['partners']],
+            'keyword_type': ['localized']
+        })
+        
     def get_keywords_for_country(self, country):
         """Get appropriate keywords for each country"""
         lang = self.locations[country]['keywords_lang']
         return self.keywords[lang]
     
-    def generate_google_analytics_data(self):
-        """Generate Google Analytics data with flexible partner integration"""
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                for city in info['cities']:
-                    # Simulate realistic traffic patterns
-                    base_traffic = random.randint(50, 800)
-                    weekend_boost = 1.4 if date.weekday() >= 5 else 1.0
-                    seasonal_boost = 1.6 if date.month in [6, 7, 8] else 1.0  # Summer boost
-                    
-                    # Partner integration boost after integration date
-                    partner_boost = 1.3 if date >= self.partner_integration_date else 1.0
-                    
-                    sessions = int(base_traffic * weekend_boost * seasonal_boost * partner_boost * random.uniform(0.8, 1.2))
-                    users = int(sessions * random.uniform(0.7, 0.9))
-                    pageviews = int(sessions * random.uniform(1.5, 3.0))
-                    bounce_rate = random.uniform(0.3, 0.7)
-                    avg_session_duration = random.uniform(60, 300)
-                    
-                    # Organic traffic simulation
-                    organic_traffic = int(sessions * random.uniform(0.4, 0.6))
-                    paid_traffic = sessions - organic_traffic
-                    
-                    data.append({
-                        'date': date,
-                        'country': country,
-                        'city': city,
-                        'location_type': info['type'],
-                        'partners': ', '.join(info['partners']),
-                        'sessions': sessions,
-                        'users': users,
-                        'pageviews': pageviews,
-                        'bounce_rate': bounce_rate,
-                        'avg_session_duration': avg_session_duration,
-                        'organic_traffic': organic_traffic,
-                        'paid_traffic': paid_traffic,
-                        'conversion_rate': random.uniform(0.01, 0.05),
-                        'revenue': sessions * random.uniform(10, 50)
-                    })
-        
-        return pd.DataFrame(data)
+    def spec_params(self):
+        """Constants every spec expression can use"""
+        return {'start_date': self.start_date, 'partner_integration_date': self.partner_integration_date}
     
-    def generate_seo_keyword_data(self):
-        """Generate SEO keyword data with proper language support"""
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                keywords = self.get_keywords_for_country(country)
-                for keyword in keywords:
-                    # Simulate keyword rankings and performance
-                    base_ranking = random.randint(1, 50)
-                    ranking = max(1, base_ranking + random.randint(-3, 3))
-                    search_volume = random.randint(100, 8000)
-                    clicks = int(search_volume * (1 / ranking) * random.uniform(0.1, 0.4))
-                    impressions = int(search_volume * random.uniform(0.5, 1.5))
-                    ctr = clicks / impressions if impressions > 0 else 0
-                    
-                    # Organic traffic calculation
-                    organic_traffic = int(clicks * random.uniform(0.8, 1.2))
-                    
-                    data.append({
-                        'date': date,
-                        'keyword': keyword,
-                        'country': country,
-                        'language': info['keywords_lang'],
-                        'ranking': ranking,
-                        'search_volume': search_volume,
-                        'clicks': clicks,
-                        'impressions': impressions,
-                        'ctr': ctr,
-                        'avg_position': ranking + random.uniform(-2, 2),
-                        'organic_traffic': organic_traffic,
-                        'keyword_type': 'localized'
-                    })
-        
-        return pd.DataFrame(data)
+    def dataset_specs(self):
+        """Map each dataset name to its spec, in output order"""
+        return {
+            'google_analytics': self.google_analytics_spec(),
+            'seo_keywords': self.seo_keyword_spec(),
+            'partner_performance': self.partner_performance_spec()
+        }
     
-    def generate_partner_performance_data(self):
-        """Generate partner performance data (optional)"""
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                for partner in info['partners']:
-                    # Simulate partner performance
-                    referrals = random.randint(10, 100)
-                    conversions = int(referrals * random.uniform(0.1, 0.3))
-                    revenue = conversions * random.uniform(50, 200)
-                    commission_rate = random.uniform(0.05, 0.15)
-                    
-                    data.append({
-                        'date': date,
-                        'country': country,
-                        'partner': partner,
-                        'referrals': referrals,
-                        'conversions': conversions,
-                        'revenue': revenue,
-                        'commission_rate': commission_rate,
-                        'commission_amount': revenue * commission_rate
-                    })
-        
-        return pd.DataFrame(data)
+    def google_analytics_spec(self):
+        """Google Analytics data with flexible partner integration"""
+        city_rows = [
+            (country, city, info['type'], ', '.join(info['partners']))
+            for country, info in self.locations.items()
+            for city in info['cities']
+        ]
+        return {
+            'dimensions': [(('country', 'city', 'location_type', 'partners'), city_rows)],
+            'columns': [
+                # Simulate realistic traffic patterns
+                ('_base_traffic', 'integers(50, 800)'),
+                ('_weekend_boost', 'where(weekday >= 5, 1.4, 1.0)'),
+                ('_seasonal_boost', 'where(isin(month, [6, 7, 8]), 1.6, 1.0)'),  # Summer boost
+                # Partner integration boost after integration date
+                ('_partner_boost', 'where(since(partner_integration_date), 1.3, 1.0)'),
+                ('sessions', 'truncate(_base_traffic * _weekend_boost * _seasonal_boost * _partner_boost * uniform(0.8, 1.2))'),
+                ('users', 'truncate(sessions * uniform(0.7, 0.9))'),
+                ('pageviews', 'truncate(sessions * uniform(1.5, 3.0))'),
+                ('bounce_rate', 'uniform(0.3, 0.7)'),
+                ('avg_session_duration', 'uniform(60, 300)'),
+                # Organic traffic simulation
+                ('organic_traffic', 'truncate(sessions * uniform(0.4, 0.6))'),
+                ('paid_traffic', 'sessions - organic_traffic'),
+                ('conversion_rate', 'uniform(0.01, 0.05)'),
+                ('revenue', 'sessions * uniform(10, 50)')
+            ]
+        }
     
-    def generate_all_data(self):
-        """Generate all datasets with flexible partner approach"""
-        print("Generating comprehensive EVAGO data with flexible partner integration...")
-        
-        # Generate core datasets
-        datasets = {
-            'google_analytics': self.generate_google_analytics_data(),
-            'seo_keywords': self.generate_seo_keyword_data(),
-            'partner_performance': self.generate_partner_performance_data()
+    def seo_keyword_spec(self):
+        """SEO keyword data with proper language support"""
+        keyword_rows = [
+            (keyword, country, info['keywords_lang'])
+            for country, info in self.locations.items()
+            for keyword in self.get_keywords_for_country(country)
+        ]
+        return {
+            'dimensions': [(('keyword', 'country', 'language'), keyword_rows)],
+            'columns': [
+                # Simulate keyword rankings and performance
+                ('_base_ranking', 'integers(1, 50)'),
+                ('ranking', 'maximum(1, _base_ranking + integers(-3, 3))'),
+                ('search_volume', 'integers(100, 8000)'),
+                ('clicks', 'truncate(search_volume * (1 / ranking) * uniform(0.1, 0.4))'),
+                ('impressions', 'truncate(search_volume * uniform(0.5, 1.5))'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('avg_position', 'ranking + uniform(-2, 2)'),
+                # Organic traffic calculation
+                ('organic_traffic', 'truncate(clicks * uniform(0.8, 1.2))'),
+                ('keyword_type', "'localized'")
+            ]
         }
-        
-        # Create data directory if it doesn't exist
-        os.makedirs('data/', exist_ok=True)
-        
-        # Save each dataset
-        for name, df in datasets.items():
-            filename = f'data/evago_{name}_data.csv'
-            df.to_csv(filename, index=False)
-            print(f"Saved {filename} with {len(df)} rows")
-        
-        # Create summary
-        summary = {
-            'datasets_generated': len(datasets),
-            'date_range': f"{self.start_date.date()} to {self.end_date.date()}",
-            'total_records': sum(len(df) for df in datasets.values()),
-            'files_created': list(datasets.keys()),
+    
+    def partner_performance_spec(self):
+        """Partner performance data (optional)"""
+        partner_rows = [
+            (country, partner)
+            for country, info in self.locations.items()
+            for partner in info['partners']
+        ]
+        return {
+            'dimensions': [(('country', 'partner'), partner_rows)],
+            'columns': [
+                # Simulate partner performance
+                ('referrals', 'integers(10, 100)'),
+                ('conversions', 'truncate(referrals * uniform(0.1, 0.3))'),
+                ('revenue', 'conversions * uniform(50, 200)'),
+                ('commission_rate', 'uniform(0.05, 0.15)'),
+                ('commission_amount', 'revenue * commission_rate')
+            ]
+        }
+    
+    generate_google_analytics_data = spec_method('google_analytics', "Generate Google Analytics data with flexible partner integration")
+    generate_seo_keyword_data = spec_method('seo_keywords', "Generate SEO keyword data with proper language support")
+    generate_partner_performance_data = spec_method('partner_performance', "Generate partner performance data (optional)")
+    
+    def summary_details(self):
+        """Simulator-specific entries of the summary file"""
+        return {
             'evago_locations': self.locations,
             'distribution_offices': self.distribution_offices,
             'partner_integration_date': self.partner_integration_date.isoformat(),
             'campaigns': self.campaigns,
             'keywords_by_language': {lang: len(keywords) for lang, keywords in self.keywords.items()},
+            'random_seed': self.random_streams.entropy,
             'note': 'Flexible partner integration - can be customized for any partner type'
         }
-        
-        with open('data/evago_flexible_data_summary.json', 'w') as f:
-            json.dump(summary, f, indent=2, default=str)
-        
-        print(f"\nData generation complete! Generated {summary['total_records']} total records.")
-        print("Files created in data/ directory:")
-        for name in datasets.keys():
-            print(f"  - evago_{name}_data.csv")
-        print("  - evago_flexible_data_summary.json")
-        
-        return datasets
 
 if __name__ == "__main__":
     simulator = EvagoFlexiblePartnerSimulator()
@@ -1,15 +1,20 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
-import json
-import os
+from datetime import datetime
+import re
+import argparse
 
-class EvagoGlobalMarketingSimulator:
-    def __init__(self):
-        self.start_date = datetime(2023, 1, 1)
-        self.end_date = datetime(2024, 12, 31)
-        self.date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='D')
+from simulation_utils import scaled_values, shared_categories
+from dataset_spec import boost, latent, rank, split
+from spec_simulator import SpecSimulator, spec_method
+
+class EvagoGlobalMarketingSimulator(SpecSimulator):
+    summary_file = 'evago_global_data_summary.json'
+    state_file = 'evago_global_generation_state.json'
+    
+    def __init__(self, seed=None, scale_factor=1, float32=False, end_date=None):
+        # Date range, dtypes and random streams, see SpecSimulator.setup_simulation
+        dimension_factor = self.setup_simulation(seed, scale_factor, float32, end_date)
         
         # EVAGO's actual global presence
         self.locations = {
@@ -52,6 +57,16 @@ class EvagoGlobalMarketingSimulator:
             'Prague', 'Vienna'
         ]
         
+        # Country-specific competitors
+        self.country_competitors = {
+            'Germany':      ['StagePro DE', 'EventBarriers GmbH', 'FestZaun', 'Mojo Legacy'],
+            'Netherlands':  ['DutchEvents', 'BarrierRent NL', 'Mojo Legacy', 'EventMasters NL'],
+            'England':      ['UK Event Hire', 'BarrierCo UK', 'Mojo Legacy', 'EventSafe UK'],
+            'North America':['US Event Solutions', 'BarrierPro USA', 'Mojo Legacy', 'EventGuard NA'],
+            'Australia':    ['AussieEvents', 'BarrierHire AU', 'Mojo Legacy', 'EventWorks AU'],
+            'Croatia':      ['CroEvent', 'Barijere HR', 'Mojo Legacy', 'EventPlus HR'],
+        }
+        
         # EVAGO + Mojo Rental campaigns
         self.campaigns = [
             # EVAGO Original Campaigns
@@ -88,95 +103,56 @@ class EvagoGlobalMarketingSimulator:
             'EVAGO-Mojo Partnership', 'Unified Rental Solutions'
         ]
         
+        # Synthetic cities, campaigns and keyword variants for larger scale factors
+        for info in self.locations.values():
+            info['cities'] = scaled_values(info['cities'], dimension_factor)
+        self.campaigns = scaled_values(self.campaigns, dimension_factor)
+        self.keywords = scaled_values(self.keywords, dimension_factor)
+        
         # Mojo acquisition date (simulated)
         self.mojo_acquisition_date = datetime(2023, 6, 1)
+        self.generation_message = (
+            "Generating comprehensive EVAGO global marketing data...\n"
+            f"Including Mojo Rental acquisition impact from {self.mojo_acquisition_date.date()}"
+        )
         
-    def generate_google_analytics_data(self):
-        """Generate Google Analytics data with global presence"""
-        data = []
+        # SEO keywords per market with their brand classification, built once per run
+        self.seo_keyword_table = self._build_seo_keyword_table()
         
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                for city in info['cities']:
-                    # Simulate realistic traffic patterns
-                    base_traffic = random.randint(50, 800)
-                    weekend_boost = 1.4 if date.weekday() >= 5 else 1.0
-                    seasonal_boost = 1.6 if date.month in [6, 7, 8] else 1.0  # Summer boost
-                    
-                    # Mojo integration boost after acquisition
-                    mojo_boost = 1.3 if date >= self.mojo_acquisition_date and info['mojo_integration'] else 1.0
-                    
-                    sessions = int(base_traffic * weekend_boost * seasonal_boost * mojo_boost * random.uniform(0.8, 1.2))
-                    users = int(sessions * random.uniform(0.7, 0.9))
-                    pageviews = int(sessions * random.uniform(1.5, 3.0))
-                    bounce_rate = random.uniform(0.3, 0.7)
-                    avg_session_duration = random.uniform(60, 300)
-                    
-                    # Organic traffic simulation
-                    organic_traffic = int(sessions * random.uniform(0.4, 0.6))
-                    paid_traffic = sessions - organic_traffic
-                    
-                    data.append({
-                        'date': date,
-                        'country': country,
-                        'city': city,
-                        'location_type': info['type'],
-                        'mojo_integration': info['mojo_integration'],
-                        'sessions': sessions,
-                        'users': users,
-                        'pageviews': pageviews,
-                        'bounce_rate': bounce_rate,
-                        'avg_session_duration': avg_session_duration,
-                        'organic_traffic': organic_traffic,
-                        'paid_traffic': paid_traffic,
-                        'conversion_rate': random.uniform(0.01, 0.05),
-                        'revenue': sessions * random.uniform(10, 50)
-                    })
+        # Fixed category sets, shared by every dataset that has the column
+        self.categories = shared_categories({
+            'country': list(self.locations),
+            'city': [city for info in self.locations.values() for city in info['cities']],
+            'location_type': [info['type'] for info in self.locations.values()],
+            'campaign': self.campaigns,
+            'ad_group': self.ad_groups,
+            'keyword': self.keywords + list(self.seo_keyword_table['keyword']),
+            'keyword_type': ['brand', 'market'],
+            'competitor': ['EVAGO'] + [competitor for _, competitor in self._competitor_rows()]
+        })
         
-        return pd.DataFrame(data)
+    def _country_rows(self):
+        """(country, location_type, mojo_integration) for every market"""
+        return [(country, info['type'], info['mojo_integration']) for country, info in self.locations.items()]
     
-    def generate_google_ads_data(self):
-        """Generate Google Ads performance data with Mojo integration"""
-        data = []
-        
-        for date in self.date_range:
-            for campaign in self.campaigns:
-                for ad_group in self.ad_groups:
-                    for country, info in self.locations.items():
-                        # Simulate realistic ad performance
-                        impressions = random.randint(1000, 15000)
-                        clicks = int(impressions * random.uniform(0.01, 0.05))
-                        cost = clicks * random.uniform(1.5, 4.0)
-                        conversions = int(clicks * random.uniform(0.02, 0.08))
-                        revenue = conversions * random.uniform(50, 200)
-                        
-                        # Mojo campaigns performance boost
-                        if 'mojo' in campaign.lower() and date >= self.mojo_acquisition_date:
-                            revenue *= 1.2
-                            conversions = int(conversions * 1.15)
-                        
-                        data.append({
-                            'date': date,
-                            'campaign': campaign,
-                            'ad_group': ad_group,
-                            'country': country,
-                            'impressions': impressions,
-                            'clicks': clicks,
-                            'cost': cost,
-                            'conversions': conversions,
-                            'revenue': revenue,
-                            'ctr': clicks / impressions if impressions > 0 else 0,
-                            'cpc': cost / clicks if clicks > 0 else 0,
-                            'conversion_rate': conversions / clicks if clicks > 0 else 0,
-                            'roas': revenue / cost if cost > 0 else 0,
-                            'is_mojo_campaign': 'mojo' in campaign.lower()
-                        })
-        
-        return pd.DataFrame(data)
+    def _city_rows(self):
+        """(country, city, location_type, mojo_integration) for every city"""
+        return [
+            (country, city, info['type'], info['mojo_integration'])
+            for country, info in self.locations.items()
+            for city in info['cities']
+        ]
+    
+    def _competitor_rows(self, own=False):
+        """(country, competitor) for every competitor in its market, with EVAGO first if own is set"""
+        return [
+            (country, competitor)
+            for country in self.locations
+            for competitor in (['EVAGO'] if own else []) + self.country_competitors.get(country, ['Mojo Legacy'])
+        ]
     
-    def generate_seo_keyword_data(self):
-        """Generate comprehensive SEO keyword data with country breakdown (relevant and common keywords)"""
-        data = []
+    def _build_seo_keyword_table(self):
+        """(country, keyword, is_brand, keyword_type, is_mojo_keyword) for every tracked SEO keyword"""
         # Define keyword-country mapping
         german_keywords = [
             'absperrgitter mieten', 'veranstaltungsinfrastruktur', 'bühnenbarrikaden',
@@ -209,381 +185,401 @@ class EvagoGlobalMarketingSimulator:
             'temporary fencing', 'event safety', 'event logistics', 'event solutions',
             'event supplier', 'event support', 'event planning'
         ]
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                # Assign keywords by country
-                if country == 'Germany':
-                    keywords = german_keywords + brand_keywords + common_keywords
-                elif country == 'Netherlands':
-                    keywords = dutch_keywords + brand_keywords + common_keywords
-                elif country in ['England', 'North America', 'Australia']:
-                    keywords = english_keywords + brand_keywords + common_keywords
-                elif country == 'Croatia':
-                    keywords = croatian_keywords + brand_keywords + common_keywords
-                else:
-                    keywords = brand_keywords + common_keywords
-                for keyword in set(keywords):
-                    # Simulate keyword rankings and performance
-                    base_ranking = random.randint(1, 50)
-                    # Mojo/brand keywords get boost after acquisition
-                    if any(brand in keyword.lower() for brand in ['mojo', 'terraplas', 'entertee', 'no fuss', 'talos', 'evago']):
-                        if date >= self.mojo_acquisition_date:
-                            base_ranking = max(1, base_ranking - 5)
-                    ranking = max(1, base_ranking + random.randint(-3, 3))
-                    search_volume = random.randint(100, 8000)
-                    clicks = int(search_volume * (1 / ranking) * random.uniform(0.1, 0.4))
-                    impressions = int(search_volume * random.uniform(0.5, 1.5))
-                    ctr = clicks / impressions if impressions > 0 else 0
-                    organic_traffic = int(clicks * random.uniform(0.8, 1.2))
-                    data.append({
-                        'date': date,
-                        'keyword': keyword,
-                        'country': country,
-                        'ranking': ranking,
-                        'search_volume': search_volume,
-                        'clicks': clicks,
-                        'impressions': impressions,
-                        'ctr': ctr,
-                        'avg_position': ranking + random.uniform(-2, 2),
-                        'organic_traffic': organic_traffic,
-                        'is_mojo_keyword': 'mojo' in keyword.lower(),
-                        'keyword_type': 'brand' if any(brand in keyword.lower() for brand in ['mojo', 'terraplas', 'entertee', 'no fuss', 'talos', 'evago']) else 'market'
-                    })
-        return pd.DataFrame(data)
+        # Assign keywords by country, keeping a stable order for reproducible output
+        market_keywords = {
+            'Germany': german_keywords,
+            'Netherlands': dutch_keywords,
+            'England': english_keywords,
+            'North America': english_keywords,
+            'Australia': english_keywords,
+            'Croatia': croatian_keywords
+        }
+        brands = ['mojo', 'terraplas', 'entertee', 'no fuss', 'talos', 'evago']
+        keyword_rows = [
+            (country, keyword)
+            for country in self.locations
+            for keyword in scaled_values(
+                dict.fromkeys(market_keywords.get(country, []) + brand_keywords + common_keywords),
+                self.dimension_factor
+            )
+        ]
+        table = pd.DataFrame(keyword_rows, columns=['country', 'keyword'])
+        
+        # Classify every keyword once, with one vectorized pattern match
+        lowered = table['keyword'].str.lower()
+        table['is_brand'] = lowered.str.contains('|'.join(re.escape(brand) for brand in brands)).to_numpy(dtype=bool)
+        table['keyword_type'] = np.where(table['is_brand'], 'brand', 'market')
+        table['is_mojo_keyword'] = lowered.str.contains('mojo', regex=False).to_numpy(dtype=bool)
+        
+        return table
+    
+    def spec_params(self):
+        """Constants every spec expression can use"""
+        return {'start_date': self.start_date, 'mojo_acquisition_date': self.mojo_acquisition_date}
     
-    def generate_social_media_data(self):
-        """Generate social media performance data with realistic platform differences"""
-        platforms = ['Facebook', 'Instagram', 'LinkedIn', 'Twitter', 'TikTok']
-        # Assign different base metrics for each platform
-        platform_bases = {
-            'Facebook':    {'reach': (6000, 90000), 'engagement': 0.025, 'conversion': 0.035},
-            'Instagram':   {'reach': (4000, 70000), 'engagement': 0.045, 'conversion': 0.030},
-            'LinkedIn':    {'reach': (2000, 30000), 'engagement': 0.020, 'conversion': 0.025},
-            'Twitter':     {'reach': (3000, 40000), 'engagement': 0.015, 'conversion': 0.020},
-            'TikTok':      {'reach': (5000, 80000), 'engagement': 0.060, 'conversion': 0.040},
+    def latent_specs(self):
+        """Latent daily traffic and paid media the traffic datasets are split from"""
+        return {
+            'traffic': self.traffic_model_spec(),
+            'paid_media': self.paid_media_model_spec(),
+            'serp': self.serp_model_spec()
         }
-        data = []
-        for date in self.date_range:
-            for platform in platforms:
-                for campaign in self.campaigns:
-                    for country, info in self.locations.items():
-                        # Use platform-specific base metrics
-                        base = platform_bases[platform]
-                        reach = random.randint(*base['reach'])
-                        impressions = int(reach * random.uniform(1.2, 2.0))
-                        engagement = int(reach * random.uniform(base['engagement'] * 0.8, base['engagement'] * 1.2))
-                        clicks = int(engagement * random.uniform(0.3, 0.7))
-                        conversions = int(clicks * random.uniform(base['conversion'] * 0.8, base['conversion'] * 1.2))
-                        # Mojo campaigns get more engagement
-                        if 'mojo' in campaign.lower() and date >= self.mojo_acquisition_date:
-                            engagement = int(engagement * 1.25)
-                            clicks = int(clicks * 1.2)
-                        data.append({
-                            'date': date,
-                            'platform': platform,
-                            'campaign': campaign,
-                            'country': country,
-                            'reach': reach,
-                            'impressions': impressions,
-                            'engagement': engagement,
-                            'clicks': clicks,
-                            'conversions': conversions,
-                            'engagement_rate': engagement / reach if reach > 0 else 0,
-                            'click_through_rate': clicks / impressions if impressions > 0 else 0,
-                            'cost': reach * random.uniform(0.01, 0.05),
-                            'is_mojo_campaign': 'mojo' in campaign.lower()
-                        })
-        return pd.DataFrame(data)
     
-    def generate_competitor_analysis_data(self):
-        """Generate country-specific competitor analysis including Mojo competitors"""
-        # Define country-specific competitors
-        country_competitors = {
-            'Germany':      ['StagePro DE', 'EventBarriers GmbH', 'FestZaun', 'Mojo Legacy'],
-            'Netherlands':  ['DutchEvents', 'BarrierRent NL', 'Mojo Legacy', 'EventMasters NL'],
-            'England':      ['UK Event Hire', 'BarrierCo UK', 'Mojo Legacy', 'EventSafe UK'],
-            'North America':['US Event Solutions', 'BarrierPro USA', 'Mojo Legacy', 'EventGuard NA'],
-            'Australia':    ['AussieEvents', 'BarrierHire AU', 'Mojo Legacy', 'EventWorks AU'],
-            'Croatia':      ['CroEvent', 'Barijere HR', 'Mojo Legacy', 'EventPlus HR'],
+    def traffic_model_spec(self):
+        """Website sessions per city and day, split into organic and paid traffic"""
+        return {
+            'dimensions': [(('country', 'city', 'location_type', 'mojo_integration'), self._city_rows())],
+            'columns': [
+                # Simulate realistic traffic patterns
+                ('_base_traffic', 'integers(50, 800)'),
+                ('_trend', '1 + days_since(start_date) * 0.001'),  # Growing trend
+                ('_weekend_boost', 'where(weekday >= 5, 1.4, 1.0)'),
+                ('_seasonal_boost', 'where(isin(month, [6, 7, 8]), 1.6, 1.0)'),  # Summer boost
+                # Mojo integration boost after acquisition
+                ('_mojo_boost', 'where(since(mojo_acquisition_date) & mojo_integration, 1.3, 1.0)'),
+                ('sessions', 'truncate(_base_traffic * _trend * _weekend_boost * _seasonal_boost * _mojo_boost * uniform(0.8, 1.2))'),
+                ('organic_traffic', 'truncate(sessions * uniform(0.4, 0.6))'),
+                ('paid_traffic', 'sessions - organic_traffic')
+            ]
         }
-        data = []
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                competitors = country_competitors.get(country, ['Mojo Legacy'])
-                for competitor in competitors:
-                    for keyword in self.keywords:
-                        # Simulate competitor performance
-                        base_ranking = random.randint(1, 30)
-                        # Mojo Legacy performance changes after acquisition
-                        if competitor == 'Mojo Legacy' and date >= self.mojo_acquisition_date:
-                            base_ranking = min(base_ranking + 5, 30)  # Worse ranking
-                        ranking = max(1, base_ranking + random.randint(-2, 2))
-                        search_volume = random.randint(200, 4000)
-                        estimated_traffic = int(search_volume * (1 / ranking) * random.uniform(0.1, 0.4))
-                        data.append({
-                            'date': date,
-                            'competitor': competitor,
-                            'keyword': keyword,
-                            'country': country,
-                            'ranking': ranking,
-                            'search_volume': search_volume,
-                            'estimated_traffic': estimated_traffic,
-                            'market_share': random.uniform(0.05, 0.25),
-                            'is_mojo_competitor': competitor == 'Mojo Legacy'
-                        })
-        return pd.DataFrame(data)
     
-    def generate_campaign_performance_data(self):
-        """Generate detailed campaign performance data with country field"""
-        data = []
-        
-        for date in self.date_range:
-            for campaign in self.campaigns:
-                for country, info in self.locations.items():
-                    # Simulate campaign metrics
-                    budget = random.uniform(100, 1500)
-                    spend = budget * random.uniform(0.7, 1.1)
-                    impressions = random.randint(5000, 60000)
-                    clicks = int(impressions * random.uniform(0.01, 0.04))
-                    conversions = int(clicks * random.uniform(0.02, 0.08))
-                    revenue = conversions * random.uniform(50, 250)
-                    
-                    # Mojo campaigns get budget boost after acquisition
-                    if 'mojo' in campaign.lower() and date >= self.mojo_acquisition_date:
-                        budget *= 1.3
-                        spend *= 1.25
-                    
-                    data.append({
-                        'date': date,
-                        'campaign': campaign,
-                        'country': country,
-                        'location_type': info['type'],
-                        'mojo_integration': info['mojo_integration'],
-                        'budget': budget,
-                        'spend': spend,
-                        'impressions': impressions,
-                        'clicks': clicks,
-                        'conversions': conversions,
-                        'revenue': revenue,
-                        'ctr': clicks / impressions if impressions > 0 else 0,
-                        'cpc': spend / clicks if clicks > 0 else 0,
-                        'roas': revenue / spend if spend > 0 else 0,
-                        'budget_utilization': spend / budget if budget > 0 else 0,
-                        'is_mojo_campaign': 'mojo' in campaign.lower()
-                    })
-        
-        return pd.DataFrame(data)
+    def paid_media_model_spec(self):
+        """Paid clicks, ad spend, conversions and revenue per campaign, country and day"""
+        return {
+            'dimensions': [
+                ('campaign', self.campaigns),
+                (('country', 'location_type', 'mojo_integration'), self._country_rows())
+            ],
+            'columns': [
+                # Every paid visit is an ad click, split across the campaigns running in the country
+                latent('_paid_traffic', 'traffic', 'paid_traffic', by=('country',)),
+                ('is_mojo_campaign', "campaign.str.lower().str.contains('mojo').to_numpy()"),
+                # Mojo campaigns get a bigger share after the acquisition
+                ('_weight', 'uniform(0.5, 1.5) * where(is_mojo_campaign & since(mojo_acquisition_date), 1.25, 1.0)'),
+                split('clicks', '_paid_traffic', '_weight', by=('country',)),
+                ('cost', 'clicks * uniform(1.5, 4.0)'),
+                # Mojo campaigns convert better after the acquisition, a higher rate keeps conversions within clicks
+                ('_mojo_uplift', 'is_mojo_campaign & since(mojo_acquisition_date)'),
+                ('conversions', 'binomial(clicks, uniform(0.02, 0.08) * where(_mojo_uplift, 1.15, 1.0))'),
+                ('revenue', 'conversions * uniform(50, 250)'),
+                boost('_mojo_uplift', revenue=1.2)
+            ]
+        }
     
-    def generate_conversion_funnel_data(self):
-        """Generate conversion funnel data (EVAGO-appropriate stages) with country field"""
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                website_visitors = random.randint(500, 4000)
-                service_page_views = int(website_visitors * random.uniform(0.4, 0.7))
-                contact_form_views = int(service_page_views * random.uniform(0.2, 0.5))
-                contact_form_submits = int(contact_form_views * random.uniform(0.2, 0.5))
-                qualified_leads = int(contact_form_submits * random.uniform(0.3, 0.7))
-                project_discussions = int(qualified_leads * random.uniform(0.3, 0.7))
-                contracts_signed = int(project_discussions * random.uniform(0.2, 0.5))
-                
-                data.append({
-                    'date': date,
-                    'country': country,
-                    'location_type': info['type'],
-                    'mojo_integration': info['mojo_integration'],
-                    'website_visitors': website_visitors,
-                    'service_page_views': service_page_views,
-                    'contact_form_views': contact_form_views,
-                    'contact_form_submits': contact_form_submits,
-                    'qualified_leads': qualified_leads,
-                    'project_discussions': project_discussions,
-                    'contracts_signed': contracts_signed
-                })
-        
-        return pd.DataFrame(data)
+    def dataset_specs(self):
+        """Map each dataset name to its spec, in output order"""
+        return {
+            'google_analytics': self.google_analytics_spec(),
+            'google_ads': self.google_ads_spec(),
+            'seo_keywords': self.seo_keyword_spec(),
+            'social_media': self.social_media_spec(),
+            'competitor_analysis': self.competitor_analysis_spec(),
+            'conversion_funnel': self.conversion_funnel_spec(),
+            'device_performance': self.device_performance_spec(),
+            'campaign_performance': self.campaign_performance_spec(),
+            'geographic_performance': self.geographic_performance_spec(),
+            'time_series': self.time_series_spec(),
+            'mojo_acquisition_impact': self.mojo_acquisition_impact_spec()
+        }
     
-    def generate_device_performance_data(self):
-        """Generate device performance data with country field and realistic device splits"""
-        devices = ['Desktop', 'Mobile', 'Tablet']
-        device_shares = {'Desktop': 0.35, 'Mobile': 0.55, 'Tablet': 0.10}
-        conversion_rates = {'Desktop': 0.045, 'Mobile': 0.025, 'Tablet': 0.015}
-        avg_revenue = {'Desktop': 120, 'Mobile': 80, 'Tablet': 60}
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                total_sessions = random.randint(1000, 6000)
-                for device in devices:
-                    sessions = int(total_sessions * device_shares[device] * random.uniform(0.9, 1.1))
-                    conversions = int(sessions * conversion_rates[device] * random.uniform(0.8, 1.2))
-                    revenue = conversions * avg_revenue[device] * random.uniform(0.8, 1.2)
-                    bounce_rate = random.uniform(0.3, 0.7)
-                    data.append({
-                        'date': date,
-                        'device': device,
-                        'country': country,
-                        'location_type': info['type'],
-                        'sessions': sessions,
-                        'conversions': conversions,
-                        'revenue': revenue,
-                        'bounce_rate': bounce_rate,
-                        'avg_session_duration': random.uniform(60, 300),
-                        'mojo_integration': info['mojo_integration']
-                    })
-        
-        return pd.DataFrame(data)
+    def serp_model_spec(self):
+        """One search results page per country, keyword and day: EVAGO and its competitors in distinct positions"""
+        return {
+            'dimensions': [(('country', 'competitor'), self._competitor_rows(own=True)), ('keyword', self.keywords)],
+            'columns': [
+                ('is_mojo_competitor', "(competitor == 'Mojo Legacy').to_numpy()"),
+                # Mojo Legacy loses ground after the acquisition
+                ('_weight', 'where(is_mojo_competitor & since(mojo_acquisition_date), 0.3, 1.0)'),
+                rank('ranking', '_weight', by=('country', 'keyword'), positions=30),
+                ('evago_ranking', "where(competitor == 'EVAGO', ranking, 0)"),
+                # Share of the page's clicks falls off with the position
+                ('visibility', '1 / ranking')
+            ]
+        }
     
-    def generate_geographic_performance_data(self):
-        """Generate geographic performance data"""
-        data = []
-        
-        for date in self.date_range:
-            for country, info in self.locations.items():
-                # Simulate geographic performance
-                impressions = random.randint(2000, 25000)
-                clicks = int(impressions * random.uniform(0.01, 0.05))
-                conversions = int(clicks * random.uniform(0.02, 0.08))
-                revenue = conversions * random.uniform(40, 200)
-                cost = clicks * random.uniform(1.5, 4.0)
-                
-                # Mojo integration boost
-                if info['mojo_integration'] and date >= self.mojo_acquisition_date:
-                    revenue *= 1.15
-                    conversions = int(conversions * 1.1)
-                
-                data.append({
-                    'date': date,
-                    'country': country,
-                    'location_type': info['type'],
-                    'impressions': impressions,
-                    'clicks': clicks,
-                    'conversions': conversions,
-                    'revenue': revenue,
-                    'cost': cost,
-                    'ctr': clicks / impressions if impressions > 0 else 0,
-                    'conversion_rate': conversions / clicks if clicks > 0 else 0,
-                    'roas': revenue / cost if cost > 0 else 0,
-                    'mojo_integration': info['mojo_integration']
-                })
-        
-        return pd.DataFrame(data)
+    def google_analytics_spec(self):
+        """Google Analytics data with global presence"""
+        return {
+            'dimensions': [(('country', 'city', 'location_type', 'mojo_integration'), self._city_rows())],
+            'columns': [
+                # Sessions come from the shared traffic model
+                latent('sessions', 'traffic', 'sessions', by=('country', 'city')),
+                ('users', 'truncate(sessions * uniform(0.7, 0.9))'),
+                ('pageviews', 'truncate(sessions * uniform(1.5, 3.0))'),
+                ('bounce_rate', 'uniform(0.3, 0.7)'),
+                ('avg_session_duration', 'uniform(60, 300)'),
+                latent('organic_traffic', 'traffic', 'organic_traffic', by=('country', 'city')),
+                latent('paid_traffic', 'traffic', 'paid_traffic', by=('country', 'city')),
+                ('conversion_rate', 'uniform(0.01, 0.05)'),
+                ('revenue', 'sessions * uniform(10, 50)')
+            ]
+        }
     
-    def generate_time_series_data(self):
-        """Generate time series data for trend analysis"""
-        data = []
-        
-        for date in self.date_range:
-            # Simulate overall business metrics over time
-            base_traffic = 1000 + (date - self.start_date).days * 3  # Growing trend
-            seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * date.timetuple().tm_yday / 365)
-            
-            # Mojo acquisition boost
-            mojo_boost = 1.2 if date >= self.mojo_acquisition_date else 1.0
-            
-            total_traffic = int(base_traffic * seasonal_factor * mojo_boost * random.uniform(0.8, 1.2))
-            total_conversions = int(total_traffic * random.uniform(0.02, 0.06))
-            total_revenue = total_conversions * random.uniform(80, 180)
-            avg_order_value = total_revenue / total_conversions if total_conversions > 0 else 0
-            
-            # Organic vs Paid traffic
-            organic_traffic = int(total_traffic * random.uniform(0.4, 0.6))
-            paid_traffic = total_traffic - organic_traffic
-            
-            data.append({
-                'date': date,
-                'total_traffic': total_traffic,
-                'organic_traffic': organic_traffic,
-                'paid_traffic': paid_traffic,
-                'total_conversions': total_conversions,
-                'total_revenue': total_revenue,
-                'avg_order_value': avg_order_value,
-                'conversion_rate': total_conversions / total_traffic if total_traffic > 0 else 0,
-                'revenue_per_visitor': total_revenue / total_traffic if total_traffic > 0 else 0,
-                'mojo_integration_active': date >= self.mojo_acquisition_date
-            })
-        
-        return pd.DataFrame(data)
+    def google_ads_spec(self):
+        """Google Ads performance data with Mojo integration"""
+        return {
+            'dimensions': [('campaign', self.campaigns), ('ad_group', self.ad_groups), ('country', list(self.locations))],
+            'columns': [
+                # Each campaign's paid clicks, spend, conversions and revenue are split across its ad groups
+                latent('_campaign_clicks', 'paid_media', 'clicks', by=('campaign', 'country')),
+                latent('_campaign_cost', 'paid_media', 'cost', by=('campaign', 'country')),
+                latent('_campaign_conversions', 'paid_media', 'conversions', by=('campaign', 'country')),
+                latent('_campaign_revenue', 'paid_media', 'revenue', by=('campaign', 'country')),
+                split('clicks', '_campaign_clicks', 'uniform(0.5, 1.5)', by=('campaign', 'country')),
+                ('cost', '_campaign_cost * safe_divide(clicks, _campaign_clicks)'),
+                ('impressions', 'truncate(clicks / uniform(0.01, 0.05))'),
+                split('conversions', '_campaign_conversions', 'clicks', by=('campaign', 'country'), capped=True),
+                ('revenue', '_campaign_revenue * safe_divide(conversions, _campaign_conversions)'),
+                ('is_mojo_campaign', "campaign.str.lower().str.contains('mojo').to_numpy()"),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('cpc', 'safe_divide(cost, clicks)'),
+                ('conversion_rate', 'safe_divide(conversions, clicks)'),
+                ('roas', 'safe_divide(revenue, cost)')
+            ],
+            'output': [
+                'date', 'campaign', 'ad_group', 'country', 'impressions', 'clicks', 'cost', 'conversions',
+                'revenue', 'ctr', 'cpc', 'conversion_rate', 'roas', 'is_mojo_campaign'
+            ]
+        }
     
-    def generate_mojo_acquisition_impact_data(self):
-        """Generate specific data showing Mojo acquisition impact"""
-        data = []
-        
-        for date in self.date_range:
-            # Pre and post acquisition metrics
-            is_post_acquisition = date >= self.mojo_acquisition_date
-            
-            # Simulate acquisition impact
-            base_metrics = {
-                'total_revenue': random.uniform(50000, 150000),
-                'total_customers': random.randint(200, 800),
-                'market_share': random.uniform(0.15, 0.35),
-                'brand_awareness': random.uniform(0.25, 0.55),
-                'customer_satisfaction': random.uniform(0.7, 0.95)
-            }
-            
-            if is_post_acquisition:
-                # Post-acquisition improvements
-                for key in base_metrics:
-                    if key in ['total_revenue', 'total_customers', 'market_share']:
-                        base_metrics[key] *= random.uniform(1.2, 1.5)
-                    else:
-                        base_metrics[key] *= random.uniform(1.05, 1.15)
-            
-            data.append({
-                'date': date,
-                'is_post_acquisition': is_post_acquisition,
-                'total_revenue': base_metrics['total_revenue'],
-                'total_customers': base_metrics['total_customers'],
-                'market_share': base_metrics['market_share'],
-                'brand_awareness': base_metrics['brand_awareness'],
-                'customer_satisfaction': base_metrics['customer_satisfaction'],
-                'acquisition_impact_score': random.uniform(0.8, 1.6) if is_post_acquisition else 1.0
-            })
-        
-        return pd.DataFrame(data)
+    def seo_keyword_spec(self):
+        """SEO keyword data with country breakdown (relevant and common keywords)"""
+        table = self.seo_keyword_table
+        return {
+            'dimensions': [(tuple(table.columns), list(table.itertuples(index=False, name=None)))],
+            'columns': [
+                # Simulate keyword rankings and performance
+                ('_base_ranking', 'integers(1, 50)'),
+                # Mojo/brand keywords get boost after acquisition
+                ('_base_ranking', 'where(is_brand & since(mojo_acquisition_date), maximum(1, _base_ranking - 5), _base_ranking)'),
+                ('ranking', 'maximum(1, _base_ranking + integers(-3, 3))'),
+                ('search_volume', 'integers(100, 8000)'),
+                ('clicks', 'truncate(search_volume * (1 / ranking) * uniform(0.1, 0.4))'),
+                ('impressions', 'truncate(search_volume * uniform(0.5, 1.5))'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('avg_position', 'ranking + uniform(-2, 2)'),
+                ('organic_traffic', 'truncate(clicks * uniform(0.8, 1.2))')
+            ],
+            'output': [
+                'date', 'keyword', 'country', 'ranking', 'search_volume', 'clicks', 'impressions', 'ctr',
+                'avg_position', 'organic_traffic', 'is_mojo_keyword', 'keyword_type'
+            ]
+        }
     
-    def generate_all_data(self):
-        """Generate all datasets and save them"""
-        print("Generating comprehensive EVAGO global marketing data...")
-        print(f"Including Mojo Rental acquisition impact from {self.mojo_acquisition_date.date()}")
-        
-        # Generate all datasets
-        datasets = {
-            'google_analytics': self.generate_google_analytics_data(),
-            'google_ads': self.generate_google_ads_data(),
-            'seo_keywords': self.generate_seo_keyword_data(),
-            'social_media': self.generate_social_media_data(),
-            'competitor_analysis': self.generate_competitor_analysis_data(),
-            'conversion_funnel': self.generate_conversion_funnel_data(),
-            'device_performance': self.generate_device_performance_data(),
-            'campaign_performance': self.generate_campaign_performance_data(),
-            'geographic_performance': self.generate_geographic_performance_data(),
-            'time_series': self.generate_time_series_data(),
-            'mojo_acquisition_impact': self.generate_mojo_acquisition_impact_data()
+    def social_media_spec(self):
+        """Social media performance data with realistic platform differences"""
+        # Platform, reach range, engagement and conversion base metrics
+        platform_rows = [
+            ('Facebook', 6000, 90000, 0.025, 0.035),
+            ('Instagram', 4000, 70000, 0.045, 0.030),
+            ('LinkedIn', 2000, 30000, 0.020, 0.025),
+            ('Twitter', 3000, 40000, 0.015, 0.020),
+            ('TikTok', 5000, 80000, 0.060, 0.040)
+        ]
+        return {
+            'dimensions': [
+                (('platform', '_reach_low', '_reach_high', '_engagement', '_conversion'), platform_rows),
+                ('campaign', self.campaigns),
+                ('country', list(self.locations))
+            ],
+            'columns': [
+                ('reach', 'integers(_reach_low, _reach_high)'),
+                ('impressions', 'truncate(reach * uniform(1.2, 2.0))'),
+                ('engagement', 'truncate(reach * uniform(_engagement * 0.8, _engagement * 1.2))'),
+                ('clicks', 'truncate(engagement * uniform(0.3, 0.7))'),
+                ('conversions', 'truncate(clicks * uniform(_conversion * 0.8, _conversion * 1.2))'),
+                # Mojo campaigns get more engagement
+                ('is_mojo_campaign', "campaign.str.lower().str.contains('mojo').to_numpy()"),
+                boost('is_mojo_campaign & since(mojo_acquisition_date)', engagement=1.25, clicks=1.2),
+                ('engagement_rate', 'safe_divide(engagement, reach)'),
+                ('click_through_rate', 'safe_divide(clicks, impressions)'),
+                ('cost', 'reach * uniform(0.01, 0.05)')
+            ],
+            'output': [
+                'date', 'platform', 'campaign', 'country', 'reach', 'impressions', 'engagement', 'clicks',
+                'conversions', 'engagement_rate', 'click_through_rate', 'cost', 'is_mojo_campaign'
+            ]
         }
-        
-        # Create data directory if it doesn't exist
-        os.makedirs('data', exist_ok=True)
-        
-        # Save each dataset
-        for name, df in datasets.items():
-            filename = f'data/evago_{name}_data.csv'
-            df.to_csv(filename, index=False)
-            print(f"Saved {filename} with {len(df)} rows")
-        
-        # Create a comprehensive summary file
-        summary = {
-            'datasets_generated': len(datasets),
-            'date_range': f"{self.start_date.date()} to {self.end_date.date()}",
-            'total_records': sum(len(df) for df in datasets.values()),
-            'files_created': list(datasets.keys()),
+    
+    def competitor_analysis_spec(self):
+        """Country-specific competitor analysis including Mojo competitors"""
+        return {
+            'dimensions': [(('country', 'competitor'), self._competitor_rows()), ('keyword', self.keywords)],
+            'columns': [
+                # Rankings come from the shared SERP model, so no two results share a position
+                latent('ranking', 'serp', 'ranking', by=('country', 'competitor', 'keyword')),
+                latent('evago_ranking', 'serp', 'evago_ranking', by=('country', 'keyword')),
+                latent('_page_visibility', 'serp', 'visibility', by=('country', 'keyword')),
+                ('is_mojo_competitor', "(competitor == 'Mojo Legacy').to_numpy()"),
+                ('search_volume', 'integers(200, 4000)'),
+                ('estimated_traffic', 'truncate(search_volume * (1 / ranking) * uniform(0.1, 0.4))'),
+                # Share of voice among all results on the page, EVAGO's included
+                ('market_share', 'safe_divide(1 / ranking, _page_visibility)')
+            ],
+            'output': [
+                'date', 'competitor', 'keyword', 'country', 'ranking', 'search_volume',
+                'estimated_traffic', 'market_share', 'is_mojo_competitor', 'evago_ranking'
+            ]
+        }
+    
+    def campaign_performance_spec(self):
+        """Detailed campaign performance data with country field"""
+        return {
+            'dimensions': [
+                ('campaign', self.campaigns),
+                (('country', 'location_type', 'mojo_integration'), self._country_rows())
+            ],
+            'columns': [
+                # Clicks, spend, conversions and revenue come from the shared paid media model
+                latent('clicks', 'paid_media', 'clicks', by=('campaign', 'country')),
+                latent('spend', 'paid_media', 'cost', by=('campaign', 'country')),
+                latent('conversions', 'paid_media', 'conversions', by=('campaign', 'country')),
+                latent('revenue', 'paid_media', 'revenue', by=('campaign', 'country')),
+                ('budget', 'spend / uniform(0.7, 1.1)'),
+                ('impressions', 'truncate(clicks / uniform(0.01, 0.04))'),
+                # Mojo campaigns get more of the paid traffic after acquisition, see paid_media_model_spec
+                ('is_mojo_campaign', "campaign.str.lower().str.contains('mojo').to_numpy()"),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('cpc', 'safe_divide(spend, clicks)'),
+                ('roas', 'safe_divide(revenue, spend)'),
+                ('budget_utilization', 'safe_divide(spend, budget)')
+            ],
+            'output': [
+                'date', 'campaign', 'country', 'location_type', 'mojo_integration', 'budget', 'spend',
+                'impressions', 'clicks', 'conversions', 'revenue', 'ctr', 'cpc', 'roas',
+                'budget_utilization', 'is_mojo_campaign'
+            ]
+        }
+    
+    def conversion_funnel_spec(self):
+        """Conversion funnel data (EVAGO-appropriate stages) with country field"""
+        return {
+            'dimensions': [(('country', 'location_type', 'mojo_integration'), self._country_rows())],
+            'columns': [
+                latent('website_visitors', 'traffic', 'sessions', by=('country',)),
+                # Each stage thins the one before it with a rate drawn per country and day
+                ('service_page_views', 'binomial(website_visitors, uniform(0.4, 0.7))'),
+                ('contact_form_views', 'binomial(service_page_views, uniform(0.2, 0.5))'),
+                ('contact_form_submits', 'binomial(contact_form_views, uniform(0.2, 0.5))'),
+                ('qualified_leads', 'binomial(contact_form_submits, uniform(0.3, 0.7))'),
+                ('project_discussions', 'binomial(qualified_leads, uniform(0.3, 0.7))'),
+                ('contracts_signed', 'binomial(project_discussions, uniform(0.2, 0.5))')
+            ]
+        }
+    
+    def device_performance_spec(self):
+        """Device performance data with country field and realistic device splits"""
+        # Device, traffic share, conversion rate and average revenue
+        device_rows = [
+            ('Desktop', 0.35, 0.045, 120),
+            ('Mobile', 0.55, 0.025, 80),
+            ('Tablet', 0.10, 0.015, 60)
+        ]
+        return {
+            'dimensions': [
+                (('country', 'location_type', 'mojo_integration'), self._country_rows()),
+                (('device', '_share', '_conversion_rate', '_avg_revenue'), device_rows)
+            ],
+            'columns': [
+                # The country's sessions, split across devices
+                latent('_total_sessions', 'traffic', 'sessions', by=('country',)),
+                split('sessions', '_total_sessions', '_share * uniform(0.9, 1.1)', by=('country',)),
+                ('conversions', 'truncate(sessions * _conversion_rate * uniform(0.8, 1.2))'),
+                ('revenue', 'conversions * _avg_revenue * uniform(0.8, 1.2)'),
+                ('bounce_rate', 'uniform(0.3, 0.7)'),
+                ('avg_session_duration', 'uniform(60, 300)')
+            ],
+            'output': [
+                'date', 'device', 'country', 'location_type', 'sessions', 'conversions', 'revenue',
+                'bounce_rate', 'avg_session_duration', 'mojo_integration'
+            ]
+        }
+    
+    def geographic_performance_spec(self):
+        """Geographic performance data"""
+        return {
+            'dimensions': [(('country', 'location_type', 'mojo_integration'), self._country_rows())],
+            'columns': [
+                # Paid clicks, ad spend, conversions and revenue of the country from the shared models
+                latent('clicks', 'traffic', 'paid_traffic', by=('country',)),
+                latent('cost', 'paid_media', 'cost', by=('country',)),
+                latent('conversions', 'paid_media', 'conversions', by=('country',)),
+                latent('revenue', 'paid_media', 'revenue', by=('country',)),
+                ('impressions', 'truncate(clicks / uniform(0.01, 0.05))'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('conversion_rate', 'safe_divide(conversions, clicks)'),
+                ('roas', 'safe_divide(revenue, cost)')
+            ],
+            'output': [
+                'date', 'country', 'location_type', 'impressions', 'clicks', 'conversions', 'revenue',
+                'cost', 'ctr', 'conversion_rate', 'roas', 'mojo_integration'
+            ]
+        }
+    
+    def time_series_spec(self):
+        """Time series data for trend analysis"""
+        return {
+            'columns': [
+                # Overall business metrics are the totals of the shared traffic model
+                ('mojo_integration_active', 'since(mojo_acquisition_date)'),
+                latent('total_traffic', 'traffic', 'sessions'),
+                ('total_conversions', 'truncate(total_traffic * uniform(0.02, 0.06))'),
+                ('total_revenue', 'total_conversions * uniform(80, 180)'),
+                # Organic vs Paid traffic
+                latent('organic_traffic', 'traffic', 'organic_traffic'),
+                latent('paid_traffic', 'traffic', 'paid_traffic'),
+                ('avg_order_value', 'safe_divide(total_revenue, total_conversions)'),
+                ('conversion_rate', 'safe_divide(total_conversions, total_traffic)'),
+                ('revenue_per_visitor', 'safe_divide(total_revenue, total_traffic)')
+            ],
+            'output': [
+                'date', 'total_traffic', 'organic_traffic', 'paid_traffic', 'total_conversions', 'total_revenue',
+                'avg_order_value', 'conversion_rate', 'revenue_per_visitor', 'mojo_integration_active'
+            ]
+        }
+    
+    def mojo_acquisition_impact_spec(self):
+        """Data showing the Mojo acquisition impact"""
+        return {
+            'columns': [
+                # Pre and post acquisition metrics
+                ('is_post_acquisition', 'since(mojo_acquisition_date)'),
+                ('total_revenue', 'uniform(50000, 150000)'),
+                ('total_customers', 'integers(200, 800)'),
+                ('market_share', 'uniform(0.15, 0.35)'),
+                ('brand_awareness', 'uniform(0.25, 0.55)'),
+                ('customer_satisfaction', 'uniform(0.7, 0.95)'),
+                # Post-acquisition improvements
+                ('total_revenue', 'where(is_post_acquisition, total_revenue * uniform(1.2, 1.5), total_revenue)'),
+                ('total_customers', 'where(is_post_acquisition, total_customers * uniform(1.2, 1.5), total_customers)'),
+                ('market_share', 'where(is_post_acquisition, market_share * uniform(1.2, 1.5), market_share)'),
+                ('brand_awareness', 'where(is_post_acquisition, brand_awareness * uniform(1.05, 1.15), brand_awareness)'),
+                ('customer_satisfaction', 'where(is_post_acquisition, customer_satisfaction * uniform(1.05, 1.15), customer_satisfaction)'),
+                ('acquisition_impact_score', 'where(is_post_acquisition, uniform(0.8, 1.6), 1.0)')
+            ]
+        }
+    
+    generate_google_analytics_data = spec_method('google_analytics', "Generate Google Analytics data with global presence")
+    generate_google_ads_data = spec_method('google_ads', "Generate Google Ads performance data with Mojo integration")
+    generate_seo_keyword_data = spec_method('seo_keywords', "Generate comprehensive SEO keyword data with country breakdown (relevant and common keywords)")
+    generate_social_media_data = spec_method('social_media', "Generate social media performance data with realistic platform differences")
+    generate_competitor_analysis_data = spec_method('competitor_analysis', "Generate country-specific competitor analysis including Mojo competitors")
+    generate_conversion_funnel_data = spec_method('conversion_funnel', "Generate conversion funnel data (EVAGO-appropriate stages) with country field")
+    generate_device_performance_data = spec_method('device_performance', "Generate device performance data with country field and realistic device splits")
+    generate_campaign_performance_data = spec_method('campaign_performance', "Generate detailed campaign performance data with country field")
+    generate_geographic_performance_data = spec_method('geographic_performance', "Generate geographic performance data")
+    generate_time_series_data = spec_method('time_series', "Generate time series data for trend analysis")
+    generate_mojo_acquisition_impact_data = spec_method('mojo_acquisition_impact', "Generate specific data showing Mojo acquisition impact")
+    
+    def summary_details(self):
+        """Simulator-specific entries of the summary file"""
+        return {
             'evago_locations': self.locations,
             'distribution_offices': self.distribution_offices,
             'mojo_acquisition_date': self.mojo_acquisition_date.isoformat(),
             'campaigns': self.campaigns,
             'keywords': self.keywords,
+            'random_seed': self.random_streams.entropy,
             'seo_sea_metrics_covered': [
                 'CTR (Click-Through Rate)',
                 'KPIs (Key Performance Indicators)',
@@ -599,18 +595,21 @@ class EvagoGlobalMarketingSimulator:
                 'Brand Awareness'
             ]
         }
-        
-        with open('data/evago_global_data_summary.json', 'w') as f:
-            json.dump(summary, f, indent=2, default=str)
-        
-        print(f"\nData generation complete! Generated {summary['total_records']} total records.")
-        print("Files created in data/ directory:")
-        for name in datasets.keys():
-            print(f"  - evago_{name}_data.csv")
-        print("  - evago_global_data_summary.json")
-        
-        return datasets
 
 if __name__ == "__main__":
-    simulator = EvagoGlobalMarketingSimulator()
-    datasets = simulator.generate_all_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate EVAGO global marketing datasets")
+    parser.add_argument('--seed', type=int, default=None, help="Root random seed for reproducible runs")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes generating datasets in parallel")
+    parser.add_argument('--shards', type=int, default=1, help="Number of date shards each dataset is split into")
+    parser.add_argument('--stream', action='store_true', help="Write datasets one month at a time to keep memory flat")
+    parser.add_argument('--scale-factor', type=float, default=1, help="Grow dates, cities, campaigns and keywords (1 = 2023-2024 baseline)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Output file format")
+    parser.add_argument('--float32', action='store_true', help="Store float metrics as float32 instead of float64")
+    parser.add_argument('--end-date', default=None, help="Last simulated day (YYYY-MM-DD), defaults to the end of the scale factor's period")
+    parser.add_argument('--append', action='store_true', help="Only generate the days after the previous run and append them")
+    args = parser.parse_args()
+    
+    simulator = EvagoGlobalMarketingSimulator(seed=args.seed, scale_factor=args.scale_factor, float32=args.float32, end_date=args.end_date)
+    datasets = simulator.generate_all_data(
+        workers=args.workers, shards=args.shards, stream=args.stream, output_format=args.format, append=args.append
+    )
@@ -1,14 +1,16 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import random
-import json
+from simulation_utils import scaled_values, shared_categories
+from spec_simulator import SpecSimulator, spec_method
 
-class EvagoMarketingDataSimulator:
-    def __init__(self):
-        self.start_date = datetime(2023, 1, 1)
-        self.end_date = datetime(2024, 12, 31)
-        self.date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='D')
+class EvagoMarketingDataSimulator(SpecSimulator):
+    # Files are written to the working directory
+    data_dir = ''
+    summary_file = 'evago_data_summary.json'
+    state_file = 'evago_generation_state.json'
+    generation_message = "Generating comprehensive EVAGO marketing data..."
+    
+    def __init__(self, seed=None, scale_factor=1, float32=False, end_date=None):
+        # Date range, dtypes and random streams, see SpecSimulator.setup_simulation
+        dimension_factor = self.setup_simulation(seed, scale_factor, float32, end_date)
         
         # EVAGO-specific data
         self.countries = ['Germany', 'Netherlands', 'Belgium', 'France', 'UK', 'Austria', 'Switzerland']
@@ -28,331 +30,213 @@ class EvagoMarketingDataSimulator:
             'Festival Equipment', 'Corporate Events', 'Sports Events', 'Music Events'
         ]
         
-    def generate_google_analytics_data(self):
-        """Generate Google Analytics data for website performance"""
-        data = []
-        
-        for date in self.date_range:
-            for country in self.countries:
+        # Synthetic campaigns and keyword variants for larger scale factors
+        self.campaigns = scaled_values(self.campaigns, dimension_factor)
+        self.keywords = scaled_values(self.keywords, dimension_factor)
+        
+        # Fixed category sets, shared by every dataset that has the column
+        self.categories = shared_categories({
+            'country': self.countries,
+            'campaign': self.campaigns,
+            'keyword': self.keywords,
+            'ad_group': self.ad_groups
+        })
+        
+    def dataset_specs(self):
+        """Map each dataset name to its spec, in output order"""
+        return {
+            'google_analytics': self.google_analytics_spec(),
+            'google_ads': self.google_ads_spec(),
+            'seo_keywords': self.seo_keyword_spec(),
+            'social_media': self.social_media_spec(),
+            'competitor_analysis': self.competitor_analysis_spec(),
+            'conversion_funnel': self.conversion_funnel_spec(),
+            'device_performance': self.device_performance_spec(),
+            'campaign_performance': self.campaign_performance_spec(),
+            'geographic_performance': self.geographic_performance_spec(),
+            'time_series': self.time_series_spec()
+        }
+    
+    def google_analytics_spec(self):
+        """Google Analytics data for website performance"""
+        return {
+            'dimensions': [('country', self.countries)],
+            'columns': [
                 # Simulate realistic traffic patterns
-                base_traffic = random.randint(100, 1000)
-                weekend_boost = 1.3 if date.weekday() >= 5 else 1.0
-                seasonal_boost = 1.5 if date.month in [6, 7, 8] else 1.0  # Summer boost
-                
-                sessions = int(base_traffic * weekend_boost * seasonal_boost * random.uniform(0.8, 1.2))
-                users = int(sessions * random.uniform(0.7, 0.9))
-                pageviews = int(sessions * random.uniform(1.5, 3.0))
-                bounce_rate = random.uniform(0.3, 0.7)
-                avg_session_duration = random.uniform(60, 300)
-                
-                data.append({
-                    'date': date,
-                    'country': country,
-                    'sessions': sessions,
-                    'users': users,
-                    'pageviews': pageviews,
-                    'bounce_rate': bounce_rate,
-                    'avg_session_duration': avg_session_duration,
-                    'conversion_rate': random.uniform(0.01, 0.05),
-                    'revenue': sessions * random.uniform(10, 50)
-                })
-        
-        return pd.DataFrame(data)
+                ('_base_traffic', 'integers(100, 1000)'),
+                ('_weekend_boost', 'where(weekday >= 5, 1.3, 1.0)'),
+                ('_seasonal_boost', 'where(isin(month, [6, 7, 8]), 1.5, 1.0)'),  # Summer boost
+                ('sessions', 'truncate(_base_traffic * _weekend_boost * _seasonal_boost * uniform(0.8, 1.2))'),
+                ('users', 'truncate(sessions * uniform(0.7, 0.9))'),
+                ('pageviews', 'truncate(sessions * uniform(1.5, 3.0))'),
+                ('bounce_rate', 'uniform(0.3, 0.7)'),
+                ('avg_session_duration', 'uniform(60, 300)'),
+                ('conversion_rate', 'uniform(0.01, 0.05)'),
+                ('revenue', 'sessions * uniform(10, 50)')
+            ]
+        }
     
-    def generate_google_ads_data(self):
-        """Generate Google Ads performance data"""
-        data = []
-        
-        for date in self.date_range:
-            for campaign in self.campaigns:
-                for ad_group in self.ad_groups:
-                    # Simulate realistic ad performance
-                    impressions = random.randint(1000, 10000)
-                    clicks = int(impressions * random.uniform(0.01, 0.05))
-                    cost = clicks * random.uniform(1.5, 4.0)
-                    conversions = int(clicks * random.uniform(0.02, 0.08))
-                    revenue = conversions * random.uniform(50, 200)
-                    
-                    data.append({
-                        'date': date,
-                        'campaign': campaign,
-                        'ad_group': ad_group,
-                        'impressions': impressions,
-                        'clicks': clicks,
-                        'cost': cost,
-                        'conversions': conversions,
-                        'revenue': revenue,
-                        'ctr': clicks / impressions if impressions > 0 else 0,
-                        'cpc': cost / clicks if clicks > 0 else 0,
-                        'conversion_rate': conversions / clicks if clicks > 0 else 0,
-                        'roas': revenue / cost if cost > 0 else 0
-                    })
-        
-        return pd.DataFrame(data)
+    def google_ads_spec(self):
+        """Google Ads performance data"""
+        return {
+            'dimensions': [('campaign', self.campaigns), ('ad_group', self.ad_groups)],
+            'columns': [
+                # Simulate realistic ad performance
+                ('impressions', 'integers(1000, 10000)'),
+                ('clicks', 'truncate(impressions * uniform(0.01, 0.05))'),
+                ('cost', 'clicks * uniform(1.5, 4.0)'),
+                ('conversions', 'truncate(clicks * uniform(0.02, 0.08))'),
+                ('revenue', 'conversions * uniform(50, 200)'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('cpc', 'safe_divide(cost, clicks)'),
+                ('conversion_rate', 'safe_divide(conversions, clicks)'),
+                ('roas', 'safe_divide(revenue, cost)')
+            ]
+        }
     
-    def generate_seo_keyword_data(self):
-        """Generate SEO keyword ranking and performance data"""
-        data = []
-        
-        for date in self.date_range:
-            for keyword in self.keywords:
-                for country in self.countries:
-                    # Simulate keyword rankings and performance
-                    ranking = random.randint(1, 50)
-                    search_volume = random.randint(100, 5000)
-                    clicks = int(search_volume * (1 / ranking) * random.uniform(0.1, 0.3))
-                    impressions = int(search_volume * random.uniform(0.5, 1.5))
-                    ctr = clicks / impressions if impressions > 0 else 0
-                    
-                    data.append({
-                        'date': date,
-                        'keyword': keyword,
-                        'country': country,
-                        'ranking': ranking,
-                        'search_volume': search_volume,
-                        'clicks': clicks,
-                        'impressions': impressions,
-                        'ctr': ctr,
-                        'avg_position': ranking + random.uniform(-2, 2)
-                    })
-        
-        return pd.DataFrame(data)
+    def seo_keyword_spec(self):
+        """SEO keyword ranking and performance data"""
+        return {
+            'dimensions': [('keyword', self.keywords), ('country', self.countries)],
+            'columns': [
+                # Simulate keyword rankings and performance
+                ('ranking', 'integers(1, 50)'),
+                ('search_volume', 'integers(100, 5000)'),
+                ('clicks', 'truncate(search_volume * (1 / ranking) * uniform(0.1, 0.3))'),
+                ('impressions', 'truncate(search_volume * uniform(0.5, 1.5))'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('avg_position', 'ranking + uniform(-2, 2)')
+            ]
+        }
     
-    def generate_social_media_data(self):
-        """Generate social media performance data"""
+    def social_media_spec(self):
+        """Social media performance data"""
         platforms = ['Facebook', 'Instagram', 'LinkedIn', 'Twitter']
-        data = []
-        
-        for date in self.date_range:
-            for platform in platforms:
-                for campaign in self.campaigns:
-                    # Simulate social media metrics
-                    reach = random.randint(5000, 50000)
-                    impressions = int(reach * random.uniform(1.2, 2.0))
-                    engagement = int(reach * random.uniform(0.01, 0.05))
-                    clicks = int(engagement * random.uniform(0.3, 0.7))
-                    conversions = int(clicks * random.uniform(0.02, 0.06))
-                    
-                    data.append({
-                        'date': date,
-                        'platform': platform,
-                        'campaign': campaign,
-                        'reach': reach,
-                        'impressions': impressions,
-                        'engagement': engagement,
-                        'clicks': clicks,
-                        'conversions': conversions,
-                        'engagement_rate': engagement / reach if reach > 0 else 0,
-                        'cost': reach * random.uniform(0.01, 0.05)
-                    })
-        
-        return pd.DataFrame(data)
+        return {
+            'dimensions': [('platform', platforms), ('campaign', self.campaigns)],
+            'columns': [
+                # Simulate social media metrics
+                ('reach', 'integers(5000, 50000)'),
+                ('engagement', 'truncate(reach * uniform(0.01, 0.05))'),
+                ('clicks', 'truncate(engagement * uniform(0.3, 0.7))'),
+                ('impressions', 'truncate(reach * uniform(1.2, 2.0))'),
+                ('conversions', 'truncate(clicks * uniform(0.02, 0.06))'),
+                ('engagement_rate', 'safe_divide(engagement, reach)'),
+                ('cost', 'reach * uniform(0.01, 0.05)')
+            ],
+            'output': [
+                'date', 'platform', 'campaign', 'reach', 'impressions', 'engagement', 'clicks',
+                'conversions', 'engagement_rate', 'cost'
+            ]
+        }
     
-    def generate_competitor_analysis_data(self):
-        """Generate competitor analysis data"""
+    def competitor_analysis_spec(self):
+        """Competitor analysis data"""
         competitors = ['Competitor A', 'Competitor B', 'Competitor C', 'Competitor D']
-        data = []
-        
-        for date in self.date_range:
-            for competitor in competitors:
-                for keyword in self.keywords[:5]:  # Top 5 keywords
-                    # Simulate competitor performance
-                    ranking = random.randint(1, 30)
-                    search_volume = random.randint(200, 3000)
-                    estimated_traffic = int(search_volume * (1 / ranking) * random.uniform(0.1, 0.4))
-                    
-                    data.append({
-                        'date': date,
-                        'competitor': competitor,
-                        'keyword': keyword,
-                        'ranking': ranking,
-                        'search_volume': search_volume,
-                        'estimated_traffic': estimated_traffic,
-                        'market_share': random.uniform(0.05, 0.25)
-                    })
-        
-        return pd.DataFrame(data)
+        return {
+            'dimensions': [('competitor', competitors), ('keyword', self.keywords[:5])],  # Top 5 keywords
+            'columns': [
+                # Simulate competitor performance
+                ('ranking', 'integers(1, 30)'),
+                ('search_volume', 'integers(200, 3000)'),
+                ('estimated_traffic', 'truncate(search_volume * (1 / ranking) * uniform(0.1, 0.4))'),
+                ('market_share', 'uniform(0.05, 0.25)')
+            ]
+        }
     
-    def generate_conversion_funnel_data(self):
-        """Generate conversion funnel data"""
-        data = []
-        
-        for date in self.date_range:
-            for country in self.countries:
+    def conversion_funnel_spec(self):
+        """Conversion funnel data"""
+        return {
+            'dimensions': [('country', self.countries)],
+            'columns': [
                 # Simulate funnel stages
-                visitors = random.randint(500, 3000)
-                page_views = int(visitors * random.uniform(1.5, 3.0))
-                add_to_cart = int(visitors * random.uniform(0.05, 0.15))
-                checkout_started = int(add_to_cart * random.uniform(0.6, 0.9))
-                purchases = int(checkout_started * random.uniform(0.7, 0.95))
-                
-                data.append({
-                    'date': date,
-                    'country': country,
-                    'visitors': visitors,
-                    'page_views': page_views,
-                    'add_to_cart': add_to_cart,
-                    'checkout_started': checkout_started,
-                    'purchases': purchases,
-                    'conversion_rate': purchases / visitors if visitors > 0 else 0
-                })
-        
-        return pd.DataFrame(data)
+                ('visitors', 'integers(500, 3000)'),
+                ('page_views', 'truncate(visitors * uniform(1.5, 3.0))'),
+                # Each stage thins the one before it with a rate drawn per country and day
+                ('add_to_cart', 'binomial(visitors, uniform(0.05, 0.15))'),
+                ('checkout_started', 'binomial(add_to_cart, uniform(0.6, 0.9))'),
+                ('purchases', 'binomial(checkout_started, uniform(0.7, 0.95))'),
+                ('conversion_rate', 'safe_divide(purchases, visitors)')
+            ]
+        }
     
-    def generate_device_performance_data(self):
-        """Generate device performance data"""
+    def device_performance_spec(self):
+        """Device performance data"""
         devices = ['Desktop', 'Mobile', 'Tablet']
-        data = []
-        
-        for date in self.date_range:
-            for device in devices:
-                for country in self.countries:
-                    # Simulate device-specific performance
-                    sessions = random.randint(200, 2000)
-                    conversions = int(sessions * random.uniform(0.01, 0.05))
-                    revenue = conversions * random.uniform(30, 150)
-                    bounce_rate = random.uniform(0.3, 0.7)
-                    
-                    data.append({
-                        'date': date,
-                        'device': device,
-                        'country': country,
-                        'sessions': sessions,
-                        'conversions': conversions,
-                        'revenue': revenue,
-                        'bounce_rate': bounce_rate,
-                        'avg_session_duration': random.uniform(60, 300)
-                    })
-        
-        return pd.DataFrame(data)
+        return {
+            'dimensions': [('device', devices), ('country', self.countries)],
+            'columns': [
+                # Simulate device-specific performance
+                ('sessions', 'integers(200, 2000)'),
+                ('conversions', 'truncate(sessions * uniform(0.01, 0.05))'),
+                ('revenue', 'conversions * uniform(30, 150)'),
+                ('bounce_rate', 'uniform(0.3, 0.7)'),
+                ('avg_session_duration', 'uniform(60, 300)')
+            ]
+        }
     
-    def generate_campaign_performance_data(self):
-        """Generate detailed campaign performance data"""
-        data = []
-        
-        for date in self.date_range:
-            for campaign in self.campaigns:
+    def campaign_performance_spec(self):
+        """Detailed campaign performance data"""
+        return {
+            'dimensions': [('campaign', self.campaigns)],
+            'columns': [
                 # Simulate campaign metrics
-                budget = random.uniform(100, 1000)
-                spend = budget * random.uniform(0.7, 1.1)
-                impressions = random.randint(5000, 50000)
-                clicks = int(impressions * random.uniform(0.01, 0.04))
-                conversions = int(clicks * random.uniform(0.02, 0.08))
-                revenue = conversions * random.uniform(50, 200)
-                
-                data.append({
-                    'date': date,
-                    'campaign': campaign,
-                    'budget': budget,
-                    'spend': spend,
-                    'impressions': impressions,
-                    'clicks': clicks,
-                    'conversions': conversions,
-                    'revenue': revenue,
-                    'ctr': clicks / impressions if impressions > 0 else 0,
-                    'cpc': spend / clicks if clicks > 0 else 0,
-                    'roas': revenue / spend if spend > 0 else 0,
-                    'budget_utilization': spend / budget if budget > 0 else 0
-                })
-        
-        return pd.DataFrame(data)
+                ('budget', 'uniform(100, 1000)'),
+                ('spend', 'budget * uniform(0.7, 1.1)'),
+                ('impressions', 'integers(5000, 50000)'),
+                ('clicks', 'truncate(impressions * uniform(0.01, 0.04))'),
+                ('conversions', 'truncate(clicks * uniform(0.02, 0.08))'),
+                ('revenue', 'conversions * uniform(50, 200)'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('cpc', 'safe_divide(spend, clicks)'),
+                ('roas', 'safe_divide(revenue, spend)'),
+                ('budget_utilization', 'safe_divide(spend, budget)')
+            ]
+        }
     
-    def generate_geographic_performance_data(self):
-        """Generate geographic performance data"""
-        data = []
-        
-        for date in self.date_range:
-            for country in self.countries:
+    def geographic_performance_spec(self):
+        """Geographic performance data"""
+        return {
+            'dimensions': [('country', self.countries)],
+            'columns': [
                 # Simulate geographic performance
-                impressions = random.randint(2000, 20000)
-                clicks = int(impressions * random.uniform(0.01, 0.05))
-                conversions = int(clicks * random.uniform(0.02, 0.08))
-                revenue = conversions * random.uniform(40, 180)
-                cost = clicks * random.uniform(1.5, 4.0)
-                
-                data.append({
-                    'date': date,
-                    'country': country,
-                    'impressions': impressions,
-                    'clicks': clicks,
-                    'conversions': conversions,
-                    'revenue': revenue,
-                    'cost': cost,
-                    'ctr': clicks / impressions if impressions > 0 else 0,
-                    'conversion_rate': conversions / clicks if clicks > 0 else 0,
-                    'roas': revenue / cost if cost > 0 else 0
-                })
-        
-        return pd.DataFrame(data)
-    
-    def generate_time_series_data(self):
-        """Generate time series data for trend analysis"""
-        data = []
-        
-        for date in self.date_range:
-            # Simulate overall business metrics over time
-            base_traffic = 1000 + (date - self.start_date).days * 2  # Growing trend
-            seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * date.timetuple().tm_yday / 365)
-            
-            total_traffic = int(base_traffic * seasonal_factor * random.uniform(0.8, 1.2))
-            total_conversions = int(total_traffic * random.uniform(0.02, 0.06))
-            total_revenue = total_conversions * random.uniform(80, 150)
-            avg_order_value = total_revenue / total_conversions if total_conversions > 0 else 0
-            
-            data.append({
-                'date': date,
-                'total_traffic': total_traffic,
-                'total_conversions': total_conversions,
-                'total_revenue': total_revenue,
-                'avg_order_value': avg_order_value,
-                'conversion_rate': total_conversions / total_traffic if total_traffic > 0 else 0,
-                'revenue_per_visitor': total_revenue / total_traffic if total_traffic > 0 else 0
-            })
-        
-        return pd.DataFrame(data)
-    
-    def generate_all_data(self):
-        """Generate all datasets and save them"""
-        print("Generating comprehensive EVAGO marketing data...")
-        
-        # Generate all datasets
-        datasets = {
-            'google_analytics': self.generate_google_analytics_data(),
-            'google_ads': self.generate_google_ads_data(),
-            'seo_keywords': self.generate_seo_keyword_data(),
-            'social_media': self.generate_social_media_data(),
-            'competitor_analysis': self.generate_competitor_analysis_data(),
-            'conversion_funnel': self.generate_conversion_funnel_data(),
-            'device_performance': self.generate_device_performance_data(),
-            'campaign_performance': self.generate_campaign_performance_data(),
-            'geographic_performance': self.generate_geographic_performance_data(),
-            'time_series': self.generate_time_series_data()
+                ('impressions', 'integers(2000, 20000)'),
+                ('clicks', 'truncate(impressions * uniform(0.01, 0.05))'),
+                ('conversions', 'truncate(clicks * uniform(0.02, 0.08))'),
+                ('revenue', 'conversions * uniform(40, 180)'),
+                ('cost', 'clicks * uniform(1.5, 4.0)'),
+                ('ctr', 'safe_divide(clicks, impressions)'),
+                ('conversion_rate', 'safe_divide(conversions, clicks)'),
+                ('roas', 'safe_divide(revenue, cost)')
+            ]
         }
-        
-        # Save each dataset
-        for name, df in datasets.items():
-            filename = f'evago_{name}_data.csv'
-            df.to_csv(filename, index=False)
-            print(f"Saved {filename} with {len(df)} rows")
-        
-        # Create a summary file
-        summary = {
-            'datasets_generated': len(datasets),
-            'date_range': f"{self.start_date.date()} to {self.end_date.date()}",
-            'total_records': sum(len(df) for df in datasets.values()),
-            'files_created': list(datasets.keys())
+    
+    def time_series_spec(self):
+        """Time series data for trend analysis"""
+        return {
+            'columns': [
+                # Simulate overall business metrics over time
+                ('_base_traffic', '1000 + days_since(start_date) * 2'),  # Growing trend
+                ('_seasonal_factor', '1 + 0.3 * sin(2 * pi * day_of_year / 365)'),
+                ('total_traffic', 'truncate(_base_traffic * _seasonal_factor * uniform(0.8, 1.2))'),
+                ('total_conversions', 'truncate(total_traffic * uniform(0.02, 0.06))'),
+                ('total_revenue', 'total_conversions * uniform(80, 150)'),
+                ('avg_order_value', 'safe_divide(total_revenue, total_conversions)'),
+                ('conversion_rate', 'safe_divide(total_conversions, total_traffic)'),
+                ('revenue_per_visitor', 'safe_divide(total_revenue, total_traffic)')
+            ]
         }
-        
-        with open('evago_data_summary.json', 'w') as f:
-            json.dump(summary, f, indent=2, default=str)
-        
-        print(f"\nData generation complete! Generated {summary['total_records']} total records.")
-        print("Files created:")
-        for name in datasets.keys():
-            print(f"  - evago_{name}_data.csv")
-        print("  - evago_data_summary.json")
-        
-        return datasets
+    
+    generate_google_analytics_data = spec_method('google_analytics', "Generate Google Analytics data for website performance")
+    generate_google_ads_data = spec_method('google_ads', "Generate Google Ads performance data")
+    generate_seo_keyword_data = spec_method('seo_keywords', "Generate SEO keyword ranking and performance data")
+    generate_social_media_data = spec_method('social_media', "Generate social media performance data")
+    generate_competitor_analysis_data = spec_method('competitor_analysis', "Generate competitor analysis data")
+    generate_conversion_funnel_data = spec_method('conversion_funnel', "Generate conversion funnel data")
+    generate_device_performance_data = spec_method('device_performance', "Generate device performance data")
+    generate_campaign_performance_data = spec_method('campaign_performance', "Generate detailed campaign performance data")
+    generate_geographic_performance_data = spec_method('geographic_performance', "Generate geographic performance data")
+    generate_time_series_data = spec_method('time_series', "Generate time series data for trend analysis")
 
 if __name__ == "__main__":
     simulator = EvagoMarketingDataSimulator()
@@ -1,46 +1,113 @@
 import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
 import json
+import os
+
+from dataset_io import generated_format, input_path, output_path, read_dataset, write_dataset
+from powerbi_utils import build_charts, growth, kpi_snapshots, moving_average, window_features
 
 class PowerBIDataPreparation:
-    def __init__(self):
+    # Columns each chart reads and their dtypes; google_ads is not charted and not loaded
+    DATASET_SCHEMAS = {
+        'google_analytics': {
+            'date': 'datetime', 'sessions': 'int32', 'users': 'int32', 'pageviews': 'int32', 'revenue': 'float64'
+        },
+        'seo_keywords': {
+            'date': 'datetime', 'keyword': 'category', 'ranking': 'int32', 'search_volume': 'int32',
+            'clicks': 'int32', 'impressions': 'int32', 'ctr': 'float64', 'avg_position': 'float64'
+        },
+        'social_media': {
+            'date': 'datetime', 'platform': 'category', 'reach': 'int32', 'impressions': 'int32',
+            'engagement': 'int32', 'clicks': 'int32', 'conversions': 'int32', 'cost': 'float64'
+        },
+        'competitor_analysis': {
+            'date': 'datetime', 'competitor': 'category', 'ranking': 'int32', 'search_volume': 'int32',
+            'estimated_traffic': 'int32', 'market_share': 'float64'
+        },
+        'conversion_funnel': {
+            'date': 'datetime', 'visitors': 'int32', 'page_views': 'int32', 'add_to_cart': 'int32',
+            'checkout_started': 'int32', 'purchases': 'int32'
+        },
+        'device_performance': {
+            'date': 'datetime', 'device': 'category', 'sessions': 'int32', 'conversions': 'int32',
+            'revenue': 'float64', 'bounce_rate': 'float64', 'avg_session_duration': 'float64'
+        },
+        'campaign_performance': {
+            'date': 'datetime', 'campaign': 'category', 'budget': 'float64', 'spend': 'float64',
+            'impressions': 'int32', 'clicks': 'int32', 'conversions': 'int32', 'revenue': 'float64',
+            'roas': 'float64'
+        },
+        'geographic_performance': {
+            'date': 'datetime', 'country': 'category', 'impressions': 'int32', 'clicks': 'int32',
+            'conversions': 'int32', 'revenue': 'float64', 'cost': 'float64'
+        },
+        'time_series': {
+            'date': 'datetime', 'total_traffic': 'int32', 'total_conversions': 'int32', 'total_revenue': 'float64',
+            'avg_order_value': 'float64', 'conversion_rate': 'float64', 'revenue_per_visitor': 'float64'
+        }
+    }
+    
+    # KPIs of chart 10, see kpi_snapshots
+    KPIS = {
+        'Total Sessions': {'dataset': 'google_analytics', 'sum': 'sessions', 'category': 'Traffic'},
+        'Total Revenue': {'dataset': 'time_series', 'sum': 'total_revenue', 'category': 'Revenue'},
+        'Conversion Rate': {'dataset': 'google_analytics', 'sum': 'sessions', 'scale': 0.03, 'category': 'Performance'},  # 3% conversion rate
+        'ROAS': {'dataset': 'campaign_performance', 'mean': 'roas', 'category': 'ROI'},
+        'Avg Order Value': {'dataset': 'time_series', 'mean': 'avg_order_value', 'category': 'Revenue'},
+        'Total Campaigns': {'dataset': 'campaign_performance', 'distinct': 'campaign', 'category': 'Campaigns'}
+    }
+    
+    # Every chart's prepare method and the datasets it reads, in output order
+    CHARTS = {
+        'chart1_traffic_overview': ('prepare_chart_1_traffic_overview', ('google_analytics',)),
+        'chart2_geographic_performance': ('prepare_chart_2_geographic_performance', ('geographic_performance',)),
+        'chart3_campaign_performance': ('prepare_chart_3_campaign_performance', ('campaign_performance',)),
+        'chart4_conversion_funnel': ('prepare_chart_4_conversion_funnel', ('conversion_funnel',)),
+        'chart5_device_performance': ('prepare_chart_5_device_performance', ('device_performance',)),
+        'chart6_seo_keywords': ('prepare_chart_6_seo_keyword_rankings', ('seo_keywords',)),
+        'chart7_social_media': ('prepare_chart_7_social_media_performance', ('social_media',)),
+        'chart8_competitor_analysis': ('prepare_chart_8_competitor_analysis', ('competitor_analysis',)),
+        'chart9_revenue_trends': ('prepare_chart_9_revenue_trends', ('time_series',)),
+        'chart10_kpi_dashboard': ('prepare_chart_10_kpi_dashboard', ('google_analytics', 'time_series', 'campaign_performance'))
+    }
+    
+    # Written by the simulator, records the format of the current datasets
+    generation_state = 'evago_generation_state.json'
+    
+    def __init__(self, output_format='csv', input_format=None):
         self.datasets = {}
+        self.output_format = output_format
+        # Format of the generated datasets, the one the simulator last wrote by default
+        self.input_format = input_format or generated_format(self.generation_state)
         
-    def load_all_datasets(self):
-        """Load all generated datasets"""
+    def load_all_datasets(self, names=None):
+        """Load the columns the charts use from every generated dataset (or the named ones), already typed"""
         print("Loading all datasets...")
         
-        dataset_files = [
-            'evago_google_analytics_data.csv',
-            'evago_google_ads_data.csv', 
-            'evago_seo_keywords_data.csv',
-            'evago_social_media_data.csv',
-            'evago_competitor_analysis_data.csv',
-            'evago_conversion_funnel_data.csv',
-            'evago_device_performance_data.csv',
-            'evago_campaign_performance_data.csv',
-            'evago_geographic_performance_data.csv',
-            'evago_time_series_data.csv'
-        ]
-        
-        for file in dataset_files:
+        for name in names or self.DATASET_SCHEMAS:
+            schema = self.DATASET_SCHEMAS[name]
+            file = input_path(f'evago_{name}_data', self.input_format)
             try:
-                name = file.replace('evago_', '').replace('_data.csv', '')
-                self.datasets[name] = pd.read_csv(file)
+                self.datasets[name] = read_dataset(file, schema)
                 print(f"Loaded {file} - {len(self.datasets[name])} rows")
             except FileNotFoundError:
                 print(f"Warning: {file} not found")
         
         return self.datasets
     
+    def save_chart(self, df, name):
+        """Write one chart table for Power BI in the configured output format"""
+        path = output_path('powerbi_' + name, self.output_format)
+        write_dataset(df, path, self.output_format)
+        print(f"Saved {os.path.basename(path)} with {len(df)} rows")
+        
+        return path
+    
     def prepare_chart_1_traffic_overview(self):
         """Chart 1: Website Traffic Overview (Line Chart)"""
         print("Preparing Chart 1: Website Traffic Overview...")
         
         # Aggregate daily traffic by country
-        traffic_data = self.datasets['google_analytics'].copy()
-        traffic_data['date'] = pd.to_datetime(traffic_data['date'])
+        traffic_data = self.datasets['google_analytics']
         
         # Daily totals
         daily_traffic = traffic_data.groupby('date').agg({
@@ -51,12 +118,13 @@ class PowerBIDataPreparation:
         }).reset_index()
         
         # Add moving averages
-        daily_traffic['sessions_ma_7d'] = daily_traffic['sessions'].rolling(7).mean()
-        daily_traffic['sessions_ma_30d'] = daily_traffic['sessions'].rolling(30).mean()
+        daily_traffic = window_features(daily_traffic, [], {
+            'sessions_ma_7d': moving_average('sessions', 7),
+            'sessions_ma_30d': moving_average('sessions', 30)
+        })
         
         # Save for Power BI
-        daily_traffic.to_csv('powerbi_chart1_traffic_overview.csv', index=False)
-        print(f"Saved powerbi_chart1_traffic_overview.csv with {len(daily_traffic)} rows")
+        self.save_chart(daily_traffic, 'chart1_traffic_overview')
         
         return daily_traffic
     
@@ -64,11 +132,10 @@ class PowerBIDataPreparation:
         """Chart 2: Geographic Performance (Map/Bar Chart)"""
         print("Preparing Chart 2: Geographic Performance...")
         
-        geo_data = self.datasets['geographic_performance'].copy()
-        geo_data['date'] = pd.to_datetime(geo_data['date'])
+        geo_data = self.datasets['geographic_performance']
         
         # Monthly performance by country
-        geo_monthly = geo_data.groupby(['country', pd.Grouper(key='date', freq='M')]).agg({
+        geo_monthly = geo_data.groupby(['country', pd.Grouper(key='date', freq='ME')], observed=True).agg({
             'impressions': 'sum',
             'clicks': 'sum',
             'conversions': 'sum',
@@ -88,8 +155,7 @@ class PowerBIDataPreparation:
         }
         geo_monthly['country_code'] = geo_monthly['country'].map(country_codes)
         
-        geo_monthly.to_csv('powerbi_chart2_geographic_performance.csv', index=False)
-        print(f"Saved powerbi_chart2_geographic_performance.csv with {len(geo_monthly)} rows")
+        self.save_chart(geo_monthly, 'chart2_geographic_performance')
         
         return geo_monthly
     
@@ -97,11 +163,10 @@ class PowerBIDataPreparation:
         """Chart 3: Campaign Performance (Bar Chart)"""
         print("Preparing Chart 3: Campaign Performance...")
         
-        campaign_data = self.datasets['campaign_performance'].copy()
-        campaign_data['date'] = pd.to_datetime(campaign_data['date'])
+        campaign_data = self.datasets['campaign_performance']
         
         # Monthly campaign performance
-        campaign_monthly = campaign_data.groupby(['campaign', pd.Grouper(key='date', freq='M')]).agg({
+        campaign_monthly = campaign_data.groupby(['campaign', pd.Grouper(key='date', freq='ME')], observed=True).agg({
             'budget': 'sum',
             'spend': 'sum',
             'impressions': 'sum',
@@ -116,8 +181,7 @@ class PowerBIDataPreparation:
         campaign_monthly['roas'] = campaign_monthly['revenue'] / campaign_monthly['spend']
         campaign_monthly['budget_utilization'] = campaign_monthly['spend'] / campaign_monthly['budget']
         
-        campaign_monthly.to_csv('powerbi_chart3_campaign_performance.csv', index=False)
-        print(f"Saved powerbi_chart3_campaign_performance.csv with {len(campaign_monthly)} rows")
+        self.save_chart(campaign_monthly, 'chart3_campaign_performance')
         
         return campaign_monthly
     
@@ -125,11 +189,10 @@ class PowerBIDataPreparation:
         """Chart 4: Conversion Funnel (Funnel Chart)"""
         print("Preparing Chart 4: Conversion Funnel...")
         
-        funnel_data = self.datasets['conversion_funnel'].copy()
-        funnel_data['date'] = pd.to_datetime(funnel_data['date'])
+        funnel_data = self.datasets['conversion_funnel']
         
         # Monthly funnel data
-        funnel_monthly = funnel_data.groupby(pd.Grouper(key='date', freq='M')).agg({
+        funnel_monthly = funnel_data.groupby(pd.Grouper(key='date', freq='ME')).agg({
             'visitors': 'sum',
             'page_views': 'sum',
             'add_to_cart': 'sum',
@@ -144,8 +207,7 @@ class PowerBIDataPreparation:
         funnel_monthly['checkout_to_purchase_rate'] = funnel_monthly['purchases'] / funnel_monthly['checkout_started']
         funnel_monthly['overall_conversion_rate'] = funnel_monthly['purchases'] / funnel_monthly['visitors']
         
-        funnel_monthly.to_csv('powerbi_chart4_conversion_funnel.csv', index=False)
-        print(f"Saved powerbi_chart4_conversion_funnel.csv with {len(funnel_monthly)} rows")
+        self.save_chart(funnel_monthly, 'chart4_conversion_funnel')
         
         return funnel_monthly
     
@@ -153,11 +215,10 @@ class PowerBIDataPreparation:
         """Chart 5: Device Performance (Pie/Bar Chart)"""
         print("Preparing Chart 5: Device Performance...")
         
-        device_data = self.datasets['device_performance'].copy()
-        device_data['date'] = pd.to_datetime(device_data['date'])
+        device_data = self.datasets['device_performance']
         
         # Monthly device performance
-        device_monthly = device_data.groupby(['device', pd.Grouper(key='date', freq='M')]).agg({
+        device_monthly = device_data.groupby(['device', pd.Grouper(key='date', freq='ME')], observed=True).agg({
             'sessions': 'sum',
             'conversions': 'sum',
             'revenue': 'sum',
@@ -169,8 +230,7 @@ class PowerBIDataPreparation:
         device_monthly['conversion_rate'] = device_monthly['conversions'] / device_monthly['sessions']
         device_monthly['revenue_per_session'] = device_monthly['revenue'] / device_monthly['sessions']
         
-        device_monthly.to_csv('powerbi_chart5_device_performance.csv', index=False)
-        print(f"Saved powerbi_chart5_device_performance.csv with {len(device_monthly)} rows")
+        self.save_chart(device_monthly, 'chart5_device_performance')
         
         return device_monthly
     
@@ -178,11 +238,10 @@ class PowerBIDataPreparation:
         """Chart 6: SEO Keyword Rankings (Line Chart)"""
         print("Preparing Chart 6: SEO Keyword Rankings...")
         
-        seo_data = self.datasets['seo_keywords'].copy()
-        seo_data['date'] = pd.to_datetime(seo_data['date'])
+        seo_data = self.datasets['seo_keywords']
         
         # Weekly keyword performance
-        seo_weekly = seo_data.groupby(['keyword', pd.Grouper(key='date', freq='W')]).agg({
+        seo_weekly = seo_data.groupby(['keyword', pd.Grouper(key='date', freq='W')], observed=True).agg({
             'ranking': 'mean',
             'search_volume': 'mean',
             'clicks': 'sum',
@@ -194,8 +253,7 @@ class PowerBIDataPreparation:
         # Calculate organic traffic potential
         seo_weekly['organic_traffic_potential'] = seo_weekly['search_volume'] * (1 / seo_weekly['ranking'])
         
-        seo_weekly.to_csv('powerbi_chart6_seo_keywords.csv', index=False)
-        print(f"Saved powerbi_chart6_seo_keywords.csv with {len(seo_weekly)} rows")
+        self.save_chart(seo_weekly, 'chart6_seo_keywords')
         
         return seo_weekly
     
@@ -203,11 +261,10 @@ class PowerBIDataPreparation:
         """Chart 7: Social Media Performance (Bar Chart)"""
         print("Preparing Chart 7: Social Media Performance...")
         
-        social_data = self.datasets['social_media'].copy()
-        social_data['date'] = pd.to_datetime(social_data['date'])
+        social_data = self.datasets['social_media']
         
         # Monthly social media performance
-        social_monthly = social_data.groupby(['platform', pd.Grouper(key='date', freq='M')]).agg({
+        social_monthly = social_data.groupby(['platform', pd.Grouper(key='date', freq='ME')], observed=True).agg({
             'reach': 'sum',
             'impressions': 'sum',
             'engagement': 'sum',
@@ -222,8 +279,7 @@ class PowerBIDataPreparation:
         social_monthly['conversion_rate'] = social_monthly['conversions'] / social_monthly['clicks']
         social_monthly['cost_per_engagement'] = social_monthly['cost'] / social_monthly['engagement']
         
-        social_monthly.to_csv('powerbi_chart7_social_media.csv', index=False)
-        print(f"Saved powerbi_chart7_social_media.csv with {len(social_monthly)} rows")
+        self.save_chart(social_monthly, 'chart7_social_media')
         
         return social_monthly
     
@@ -231,11 +287,10 @@ class PowerBIDataPreparation:
         """Chart 8: Competitor Analysis (Bar Chart)"""
         print("Preparing Chart 8: Competitor Analysis...")
         
-        competitor_data = self.datasets['competitor_analysis'].copy()
-        competitor_data['date'] = pd.to_datetime(competitor_data['date'])
+        competitor_data = self.datasets['competitor_analysis']
         
         # Monthly competitor performance
-        competitor_monthly = competitor_data.groupby(['competitor', pd.Grouper(key='date', freq='M')]).agg({
+        competitor_monthly = competitor_data.groupby(['competitor', pd.Grouper(key='date', freq='ME')], observed=True).agg({
             'ranking': 'mean',
             'search_volume': 'sum',
             'estimated_traffic': 'sum',
@@ -245,8 +300,7 @@ class PowerBIDataPreparation:
         # Calculate average ranking
         competitor_monthly['avg_ranking'] = competitor_monthly['ranking']
         
-        competitor_monthly.to_csv('powerbi_chart8_competitor_analysis.csv', index=False)
-        print(f"Saved powerbi_chart8_competitor_analysis.csv with {len(competitor_monthly)} rows")
+        self.save_chart(competitor_monthly, 'chart8_competitor_analysis')
         
         return competitor_monthly
     
@@ -254,8 +308,7 @@ class PowerBIDataPreparation:
         """Chart 9: Revenue Trends (Line Chart)"""
         print("Preparing Chart 9: Revenue Trends...")
         
-        time_data = self.datasets['time_series'].copy()
-        time_data['date'] = pd.to_datetime(time_data['date'])
+        time_data = self.datasets['time_series']
         
         # Weekly revenue trends
         revenue_weekly = time_data.groupby(pd.Grouper(key='date', freq='W')).agg({
@@ -267,109 +320,47 @@ class PowerBIDataPreparation:
             'revenue_per_visitor': 'mean'
         }).reset_index()
         
-        # Add growth rates
-        revenue_weekly['revenue_growth'] = revenue_weekly['total_revenue'].pct_change()
-        revenue_weekly['traffic_growth'] = revenue_weekly['total_traffic'].pct_change()
+        # Add week over week growth rates
+        revenue_weekly = window_features(revenue_weekly, [], {
+            'revenue_growth': growth('total_revenue'),
+            'traffic_growth': growth('total_traffic')
+        })
         
-        revenue_weekly.to_csv('powerbi_chart9_revenue_trends.csv', index=False)
-        print(f"Saved powerbi_chart9_revenue_trends.csv with {len(revenue_weekly)} rows")
+        self.save_chart(revenue_weekly, 'chart9_revenue_trends')
         
         return revenue_weekly
     
     def prepare_chart_10_kpi_dashboard(self):
-        """Chart 10: KPI Dashboard (Cards/Gauges)"""
+        """Chart 10: KPI Dashboard (Cards/Gauges)
+
+        A KPI snapshot table: every KPI month to date as of each month end
+        (and the last day of data), so the cards can be sliced by
+        as_of_date whatever the current date.
+        """
         print("Preparing Chart 10: KPI Dashboard...")
         
-        # Create KPI summary data
-        kpi_data = []
-        
-        # Current month KPIs
-        current_date = datetime.now()
-        current_month = current_date.replace(day=1)
-        
-        # Traffic KPIs
-        traffic_data = self.datasets['google_analytics'].copy()
-        traffic_data['date'] = pd.to_datetime(traffic_data['date'])
-        current_month_traffic = traffic_data[traffic_data['date'] >= current_month]
-        
-        # Revenue KPIs
-        revenue_data = self.datasets['time_series'].copy()
-        revenue_data['date'] = pd.to_datetime(revenue_data['date'])
-        current_month_revenue = revenue_data[revenue_data['date'] >= current_month]
-        
-        # Campaign KPIs
-        campaign_data = self.datasets['campaign_performance'].copy()
-        campaign_data['date'] = pd.to_datetime(campaign_data['date'])
-        current_month_campaigns = campaign_data[campaign_data['date'] >= current_month]
-        
-        kpi_data.append({
-            'metric': 'Total Sessions',
-            'value': current_month_traffic['sessions'].sum(),
-            'category': 'Traffic'
-        })
-        
-        kpi_data.append({
-            'metric': 'Total Revenue',
-            'value': current_month_revenue['total_revenue'].sum(),
-            'category': 'Revenue'
-        })
-        
-        kpi_data.append({
-            'metric': 'Conversion Rate',
-            'value': (current_month_traffic['sessions'].sum() * 0.03),  # 3% conversion rate
-            'category': 'Performance'
-        })
-        
-        kpi_data.append({
-            'metric': 'ROAS',
-            'value': current_month_campaigns['roas'].mean(),
-            'category': 'ROI'
-        })
-        
-        kpi_data.append({
-            'metric': 'Avg Order Value',
-            'value': current_month_revenue['avg_order_value'].mean(),
-            'category': 'Revenue'
-        })
-        
-        kpi_data.append({
-            'metric': 'Total Campaigns',
-            'value': len(current_month_campaigns['campaign'].unique()),
-            'category': 'Campaigns'
-        })
-        
-        kpi_df = pd.DataFrame(kpi_data)
-        kpi_df.to_csv('powerbi_chart10_kpi_dashboard.csv', index=False)
-        print(f"Saved powerbi_chart10_kpi_dashboard.csv with {len(kpi_df)} rows")
+        kpi_df = kpi_snapshots(self.datasets, self.KPIS, months=1, calendar=True)
+        self.save_chart(kpi_df, 'chart10_kpi_dashboard')
         
         return kpi_df
     
-    def create_powerbi_data_model(self):
-        """Create a comprehensive data model for Power BI"""
+    def create_powerbi_data_model(self, workers=1, executor='thread'):
+        """Create a comprehensive data model for Power BI
+
+        With workers > 1 the charts are built in a thread or process pool
+        (executor), each as soon as its source datasets are loaded. The
+        summary is written once every chart is done.
+        """
         print("Creating Power BI data model...")
         
-        # Load all datasets
-        self.load_all_datasets()
-        
-        # Prepare all charts
-        charts = {
-            'chart1_traffic_overview': self.prepare_chart_1_traffic_overview(),
-            'chart2_geographic_performance': self.prepare_chart_2_geographic_performance(),
-            'chart3_campaign_performance': self.prepare_chart_3_campaign_performance(),
-            'chart4_conversion_funnel': self.prepare_chart_4_conversion_funnel(),
-            'chart5_device_performance': self.prepare_chart_5_device_performance(),
-            'chart6_seo_keywords': self.prepare_chart_6_seo_keyword_rankings(),
-            'chart7_social_media': self.prepare_chart_7_social_media_performance(),
-            'chart8_competitor_analysis': self.prepare_chart_8_competitor_analysis(),
-            'chart9_revenue_trends': self.prepare_chart_9_revenue_trends(),
-            'chart10_kpi_dashboard': self.prepare_chart_10_kpi_dashboard()
-        }
+        # Load the source datasets and prepare all charts, in parallel with workers > 1
+        charts = build_charts(self, self.CHARTS, workers, executor)
         
         # Create summary
         summary = {
             'charts_prepared': len(charts),
             'total_files': len(charts),
-            'files_created': [f'powerbi_{name}.csv' for name in charts.keys()],
+            'files_created': [output_path(f'powerbi_{name}', self.output_format) for name in charts.keys()],
             'chart_descriptions': {
                 'chart1_traffic_overview': 'Website Traffic Overview - Line Chart',
                 'chart2_geographic_performance': 'Geographic Performance - Map/Bar Chart',
@@ -390,7 +381,7 @@ class PowerBIDataPreparation:
         print("\nPower BI data preparation complete!")
         print("Files created for Power BI:")
         for name, desc in summary['chart_descriptions'].items():
-            print(f"  - powerbi_{name}.csv: {desc}")
+            print(f"  - {output_path(f'powerbi_{name}', self.output_format)}: {desc}")
         print("  - powerbi_data_summary.json")
         
         return charts
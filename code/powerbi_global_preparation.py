@@ -3,64 +3,218 @@ import numpy as np
 from datetime import datetime, timedelta
 import json
 import os
+import argparse
+
+from dataset_io import OUTPUT_FORMATS, generated_format, input_path, iter_dataset, output_path, read_dataset, write_dataset
+from powerbi_utils import (
+    CHART_EXECUTORS, CUBE_BACKENDS, CUBE_ROWS, build_charts, build_star_schema, chart_build_keys, chunked_daily_cube,
+    code_version, daily_cube, duckdb_daily_cube, file_digest, growth, moving_average, read_build_manifest, roll_up,
+    kpi_snapshots, stale_charts, window_features, write_build_manifest
+)
 
 class PowerBIGlobalDataPreparation:
-    def __init__(self):
+    # Columns each chart reads and their dtypes; google_ads is not charted and not loaded.
+    # The category and bool columns are the dimensions of each dataset's daily cube
+    DATASET_SCHEMAS = {
+        'google_analytics': {
+            'date': 'datetime', 'country': 'category', 'location_type': 'category', 'sessions': 'int32',
+            'users': 'int32', 'pageviews': 'int32', 'organic_traffic': 'int32', 'paid_traffic': 'int32',
+            'revenue': 'float64'
+        },
+        'seo_keywords': {
+            'date': 'datetime', 'keyword': 'category', 'country': 'category', 'ranking': 'int32',
+            'search_volume': 'int32', 'clicks': 'int32', 'impressions': 'int32', 'ctr': 'float64',
+            'avg_position': 'float64', 'organic_traffic': 'int32', 'is_mojo_keyword': 'bool', 'keyword_type': 'category'
+        },
+        'social_media': {
+            'date': 'datetime', 'platform': 'category', 'reach': 'int32', 'impressions': 'int32',
+            'engagement': 'int32', 'clicks': 'int32', 'conversions': 'int32', 'cost': 'float64',
+            'is_mojo_campaign': 'bool'
+        },
+        'competitor_analysis': {
+            'date': 'datetime', 'competitor': 'category', 'keyword': 'category', 'country': 'category',
+            'ranking': 'int32', 'search_volume': 'int32', 'estimated_traffic': 'int32', 'market_share': 'float64',
+            'is_mojo_competitor': 'bool'
+        },
+        'conversion_funnel': {
+            'date': 'datetime', 'country': 'category', 'location_type': 'category', 'mojo_integration': 'bool',
+            'website_visitors': 'int32', 'service_page_views': 'int32', 'contact_form_views': 'int32',
+            'contact_form_submits': 'int32', 'qualified_leads': 'int32', 'project_discussions': 'int32',
+            'contracts_signed': 'int32'
+        },
+        'device_performance': {
+            'date': 'datetime', 'device': 'category', 'country': 'category', 'location_type': 'category',
+            'sessions': 'int32', 'conversions': 'int32', 'revenue': 'float64', 'bounce_rate': 'float64',
+            'avg_session_duration': 'float64', 'mojo_integration': 'bool'
+        },
+        'campaign_performance': {
+            'date': 'datetime', 'campaign': 'category', 'country': 'category', 'budget': 'float64',
+            'spend': 'float64', 'impressions': 'int32', 'clicks': 'int32', 'conversions': 'int32',
+            'revenue': 'float64', 'roas': 'float64', 'is_mojo_campaign': 'bool'
+        },
+        'geographic_performance': {
+            'date': 'datetime', 'country': 'category', 'location_type': 'category', 'impressions': 'int32',
+            'clicks': 'int32', 'conversions': 'int32', 'revenue': 'float64', 'cost': 'float64'
+        },
+        'time_series': {
+            'date': 'datetime', 'total_traffic': 'int32', 'organic_traffic': 'int32', 'paid_traffic': 'int32',
+            'total_conversions': 'int32', 'total_revenue': 'float64', 'avg_order_value': 'float64',
+            'conversion_rate': 'float64', 'revenue_per_visitor': 'float64', 'mojo_integration_active': 'bool'
+        },
+        'mojo_acquisition_impact': {
+            'date': 'datetime', 'market_share': 'float64', 'brand_awareness': 'float64',
+            'acquisition_impact_score': 'float64'
+        }
+    }
+    
+    # Every chart's prepare method and the datasets it reads, in output order
+    CHARTS = {
+        'chart1_global_traffic_overview': ('prepare_chart_1_global_traffic_overview', ('google_analytics',)),
+        'chart2_geographic_performance_map': ('prepare_chart_2_geographic_performance_map', ('geographic_performance',)),
+        'chart3_campaign_performance_comparison': ('prepare_chart_3_campaign_performance_comparison', ('campaign_performance',)),
+        'chart4_conversion_funnel_analysis': ('prepare_chart_4_conversion_funnel_analysis', ('conversion_funnel',)),
+        'chart5_device_performance_breakdown': ('prepare_chart_5_device_performance_breakdown', ('device_performance',)),
+        'chart6_seo_keyword_rankings_trends': ('prepare_chart_6_seo_keyword_rankings_trends', ('seo_keywords',)),
+        'chart7_social_media_performance_comparison': ('prepare_chart_7_social_media_performance_comparison', ('social_media',)),
+        'chart8_competitor_analysis_dashboard': ('prepare_chart_8_competitor_analysis_dashboard', ('competitor_analysis',)),
+        'chart9_revenue_trends_analysis': ('prepare_chart_9_revenue_trends_analysis', ('time_series',)),
+        'chart10_mojo_acquisition_impact_dashboard': (
+            'prepare_chart_10_mojo_acquisition_impact_dashboard',
+            ('google_analytics', 'time_series', 'campaign_performance', 'mojo_acquisition_impact')
+        )
+    }
+    
+    # KPIs of chart 10, see kpi_snapshots
+    KPIS = {
+        'Total Sessions': {'dataset': 'google_analytics', 'sum': 'sessions', 'category': 'Traffic', 'mojo_impact': 'Global'},
+        'Total Revenue': {'dataset': 'time_series', 'sum': 'total_revenue', 'category': 'Revenue', 'mojo_impact': 'Global'},
+        'Organic Traffic': {'dataset': 'google_analytics', 'sum': 'organic_traffic', 'category': 'SEO', 'mojo_impact': 'Enhanced'},
+        'ROAS': {'dataset': 'campaign_performance', 'mean': 'roas', 'category': 'ROI', 'mojo_impact': 'Improved'},
+        'Market Share': {'dataset': 'mojo_acquisition_impact', 'mean': 'market_share', 'category': 'Market', 'mojo_impact': 'Expanded'},
+        'Brand Awareness': {
+            'dataset': 'mojo_acquisition_impact', 'mean': 'brand_awareness', 'category': 'Brand', 'mojo_impact': 'Strengthened'
+        },
+        'Mojo Campaigns': {'dataset': 'campaign_performance', 'count': 'is_mojo_campaign', 'category': 'Campaigns', 'mojo_impact': 'New'},
+        'Acquisition Impact Score': {
+            'dataset': 'mojo_acquisition_impact', 'mean': 'acquisition_impact_score', 'category': 'Performance',
+            'mojo_impact': 'Positive'
+        }
+    }
+    
+    # Columns of the chart tables that become star schema dimensions, with the attributes that can move along
+    STAR_DIMENSIONS = {
+        'date': (),
+        'country': ('location_type', 'country_code'),
+        'campaign': ('is_mojo_campaign',),
+        'keyword': ('keyword_type', 'is_mojo_keyword'),
+        'competitor': ('is_mojo_competitor',)
+    }
+    # Chart columns that refer to one of the dimensions under another name
+    STAR_ROLES = {'as_of_date': 'date'}
+    
+    # Records what every chart was last built from, so unchanged charts are skipped
+    build_manifest = 'powerbi_dashboards/powerbi_global_build_manifest.json'
+    # Written by the global simulator, records the format of the current datasets
+    generation_state = 'data/evago_global_generation_state.json'
+    star_schema_dir = 'powerbi_dashboards/star_schema'
+    
+    def __init__(self, output_format='csv', chunk_rows=None, backend='pandas', input_format=None):
+        if backend not in CUBE_BACKENDS:
+            raise ValueError(f"Unknown cube backend {backend!r}, expected one of {list(CUBE_BACKENDS)}")
         self.datasets = {}
-        
-    def load_all_datasets(self):
-        """Load all generated datasets"""
+        self.output_format = output_format
+        # Format of the generated datasets, the one the simulator last wrote by default
+        self.input_format = input_format or generated_format(self.generation_state)
+        # Read the datasets in chunks of this many rows, for files larger than memory
+        self.chunk_rows = chunk_rows
+        # Engine that aggregates the raw rows into the daily cubes
+        self.backend = backend
+        
+    def load_all_datasets(self, names=None):
+        """Load every generated dataset (or the named ones) as its daily cube
+
+        Only the columns the charts use are read, already typed, and rolled
+        up to one row per date and dimensions (see daily_cube). The charts
+        aggregate these cubes further and never see the raw rows.
+
+        With chunk_rows set each file is read and aggregated chunk by chunk
+        (see chunked_daily_cube), so only one chunk of raw rows is held in
+        memory. The cubes are identical to those of a full read. With the
+        duckdb backend DuckDB aggregates the files itself, on all cores and
+        without loading the raw rows (see duckdb_daily_cube).
+        """
         print("Loading all global datasets...")
         
-        dataset_files = [
-            'data/evago_google_analytics_data.csv',
-            'data/evago_google_ads_data.csv', 
-            'data/evago_seo_keywords_data.csv',
-            'data/evago_social_media_data.csv',
-            'data/evago_competitor_analysis_data.csv',
-            'data/evago_conversion_funnel_data.csv',
-            'data/evago_device_performance_data.csv',
-            'data/evago_campaign_performance_data.csv',
-            'data/evago_geographic_performance_data.csv',
-            'data/evago_time_series_data.csv',
-            'data/evago_mojo_acquisition_impact_data.csv'
-        ]
-        
-        for file in dataset_files:
+        for name in names or self.DATASET_SCHEMAS:
+            schema = self.DATASET_SCHEMAS[name]
+            file = self.dataset_file(name)
             try:
-                name = file.replace('data/evago_', '').replace('_data.csv', '')
-                self.datasets[name] = pd.read_csv(file)
-                print(f"Loaded {file} - {len(self.datasets[name])} rows")
+                if self.backend == 'duckdb':
+                    self.datasets[name] = duckdb_daily_cube(file, schema)
+                elif self.chunk_rows:
+                    self.datasets[name] = chunked_daily_cube(iter_dataset(file, schema, self.chunk_rows), schema)
+                else:
+                    self.datasets[name] = daily_cube(read_dataset(file, schema), schema)
+                rows = self.datasets[name][CUBE_ROWS].sum()
+                print(f"Loaded {file} - {rows} rows, {len(self.datasets[name])} in its daily cube")
             except FileNotFoundError:
                 print(f"Warning: {file} not found")
         
         return self.datasets
     
+    def dataset_file(self, name):
+        """Generated file of one dataset in the input format, failing when a copy in another format is newer"""
+        return input_path(f'data/evago_{name}_data', self.input_format)
+    
+    def dataset_files(self, name):
+        """The file of one dataset that is read, followed by its existing copies in other formats"""
+        file = self.dataset_file(name)
+        copies = [output_path(f'data/evago_{name}_data', fmt) for fmt in OUTPUT_FORMATS]
+        return [file] + [copy for copy in copies if copy != file and os.path.exists(copy)]
+    
+    def chart_path(self, name):
+        return output_path('powerbi_dashboards/powerbi_' + name, self.output_format)
+    
+    def read_chart(self, name):
+        """Read back a chart table written by an earlier run"""
+        df = read_dataset(self.chart_path(name))
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'])
+        return df
+    
+    def save_chart(self, df, name):
+        """Write one chart table for Power BI in the configured output format"""
+        path = self.chart_path(name)
+        write_dataset(df, path, self.output_format)
+        print(f"Saved {os.path.basename(path)} with {len(df)} rows")
+        
+        return path
+    
     def prepare_chart_1_global_traffic_overview(self):
         """Chart 1: Global Website Traffic Overview (Line Chart)"""
         print("Preparing Chart 1: Global Website Traffic Overview...")
         
         # Aggregate daily traffic by country and city
-        traffic_data = self.datasets['google_analytics'].copy()
-        traffic_data['date'] = pd.to_datetime(traffic_data['date'])
+        traffic_data = self.datasets['google_analytics']
         
         # Daily totals with location breakdown
-        daily_traffic = traffic_data.groupby(['date', 'country', 'location_type']).agg({
+        daily_traffic = roll_up(traffic_data, ['date', 'country', 'location_type'], {
             'sessions': 'sum',
             'users': 'sum', 
             'pageviews': 'sum',
             'revenue': 'sum',
             'organic_traffic': 'sum',
             'paid_traffic': 'sum'
-        }).reset_index()
+        })
         
-        # Add moving averages
-        daily_traffic['sessions_ma_7d'] = daily_traffic.groupby('country')['sessions'].rolling(7).mean().reset_index(0, drop=True)
-        daily_traffic['sessions_ma_30d'] = daily_traffic.groupby('country')['sessions'].rolling(30).mean().reset_index(0, drop=True)
+        # Add moving averages, over each country's days
+        daily_traffic = window_features(daily_traffic, ['country'], {
+            'sessions_ma_7d': moving_average('sessions', 7),
+            'sessions_ma_30d': moving_average('sessions', 30)
+        })
         
         # Save for Power BI
-        daily_traffic.to_csv('powerbi_dashboards/powerbi_chart1_global_traffic_overview.csv', index=False)
-        print(f"Saved powerbi_chart1_global_traffic_overview.csv with {len(daily_traffic)} rows")
+        self.save_chart(daily_traffic, 'chart1_global_traffic_overview')
         
         return daily_traffic
     
@@ -68,17 +222,16 @@ class PowerBIGlobalDataPreparation:
         """Chart 2: Geographic Performance Map (Map Chart)"""
         print("Preparing Chart 2: Geographic Performance Map...")
         
-        geo_data = self.datasets['geographic_performance'].copy()
-        geo_data['date'] = pd.to_datetime(geo_data['date'])
+        geo_data = self.datasets['geographic_performance']
         
         # Monthly performance by country
-        geo_monthly = geo_data.groupby(['country', 'location_type', pd.Grouper(key='date', freq='ME')]).agg({
+        geo_monthly = roll_up(geo_data, ['country', 'location_type'], {
             'impressions': 'sum',
             'clicks': 'sum',
             'conversions': 'sum',
             'revenue': 'sum',
             'cost': 'sum'
-        }).reset_index()
+        }, freq='ME')
         
         # Calculate KPIs
         geo_monthly['ctr'] = geo_monthly['clicks'] / geo_monthly['impressions']
@@ -92,8 +245,7 @@ class PowerBIGlobalDataPreparation:
         }
         geo_monthly['country_code'] = geo_monthly['country'].map(country_codes)
         
-        geo_monthly.to_csv('powerbi_dashboards/powerbi_chart2_geographic_performance_map.csv', index=False)
-        print(f"Saved powerbi_chart2_geographic_performance_map.csv with {len(geo_monthly)} rows")
+        self.save_chart(geo_monthly, 'chart2_geographic_performance_map')
         
         return geo_monthly
     
@@ -101,18 +253,17 @@ class PowerBIGlobalDataPreparation:
         """Chart 3: Campaign Performance Comparison (Bar Chart) with country breakdown"""
         print("Preparing Chart 3: Campaign Performance Comparison...")
         
-        campaign_data = self.datasets['campaign_performance'].copy()
-        campaign_data['date'] = pd.to_datetime(campaign_data['date'])
+        campaign_data = self.datasets['campaign_performance']
         
         # Monthly campaign performance by country
-        campaign_monthly = campaign_data.groupby(['country', 'campaign', 'is_mojo_campaign', pd.Grouper(key='date', freq='ME')]).agg({
+        campaign_monthly = roll_up(campaign_data, ['country', 'campaign', 'is_mojo_campaign'], {
             'budget': 'sum',
             'spend': 'sum',
             'impressions': 'sum',
             'clicks': 'sum',
             'conversions': 'sum',
             'revenue': 'sum'
-        }).reset_index()
+        }, freq='ME')
         
         # Calculate KPIs
         campaign_monthly['ctr'] = campaign_monthly['clicks'] / campaign_monthly['impressions']
@@ -120,19 +271,17 @@ class PowerBIGlobalDataPreparation:
         campaign_monthly['roas'] = campaign_monthly['revenue'] / campaign_monthly['spend']
         campaign_monthly['budget_utilization'] = campaign_monthly['spend'] / campaign_monthly['budget']
         
-        campaign_monthly.to_csv('powerbi_dashboards/powerbi_chart3_campaign_performance_comparison.csv', index=False)
-        print(f"Saved powerbi_chart3_campaign_performance_comparison.csv with {len(campaign_monthly)} rows")
+        self.save_chart(campaign_monthly, 'chart3_campaign_performance_comparison')
         return campaign_monthly
     
     def prepare_chart_4_conversion_funnel_analysis(self):
         """Chart 4: Conversion Funnel Analysis (Funnel Chart) with country breakdown"""
         print("Preparing Chart 4: Conversion Funnel Analysis...")
         
-        funnel_data = self.datasets['conversion_funnel'].copy()
-        funnel_data['date'] = pd.to_datetime(funnel_data['date'])
+        funnel_data = self.datasets['conversion_funnel']
         
         # Monthly funnel data by country
-        funnel_monthly = funnel_data.groupby(['country', 'location_type', 'mojo_integration', pd.Grouper(key='date', freq='ME')]).agg({
+        funnel_monthly = roll_up(funnel_data, ['country', 'location_type', 'mojo_integration'], {
             'website_visitors': 'sum',
             'service_page_views': 'sum',
             'contact_form_views': 'sum',
@@ -140,7 +289,7 @@ class PowerBIGlobalDataPreparation:
             'qualified_leads': 'sum',
             'project_discussions': 'sum',
             'contracts_signed': 'sum'
-        }).reset_index()
+        }, freq='ME')
         
         # Calculate conversion rates between stages
         funnel_monthly['visitor_to_pageview_rate'] = funnel_monthly['service_page_views'] / funnel_monthly['website_visitors']
@@ -151,39 +300,35 @@ class PowerBIGlobalDataPreparation:
         funnel_monthly['discussion_to_contract_rate'] = funnel_monthly['contracts_signed'] / funnel_monthly['project_discussions']
         funnel_monthly['overall_conversion_rate'] = funnel_monthly['contracts_signed'] / funnel_monthly['website_visitors']
         
-        funnel_monthly.to_csv('powerbi_dashboards/powerbi_chart4_conversion_funnel_analysis.csv', index=False)
-        print(f"Saved powerbi_chart4_conversion_funnel_analysis.csv with {len(funnel_monthly)} rows")
+        self.save_chart(funnel_monthly, 'chart4_conversion_funnel_analysis')
         return funnel_monthly
     
     def prepare_chart_5_device_performance_breakdown(self):
         """Chart 5: Device Performance Breakdown (Pie Chart) with country breakdown"""
         print("Preparing Chart 5: Device Performance Breakdown...")
         
-        device_data = self.datasets['device_performance'].copy()
-        device_data['date'] = pd.to_datetime(device_data['date'])
+        device_data = self.datasets['device_performance']
         
         # Monthly device performance by country
-        device_monthly = device_data.groupby(['country', 'device', 'location_type', 'mojo_integration', pd.Grouper(key='date', freq='ME')]).agg({
+        device_monthly = roll_up(device_data, ['country', 'device', 'location_type', 'mojo_integration'], {
             'sessions': 'sum',
             'conversions': 'sum',
             'revenue': 'sum',
             'bounce_rate': 'mean',
             'avg_session_duration': 'mean'
-        }).reset_index()
+        }, freq='ME')
         
-        device_monthly.to_csv('powerbi_dashboards/powerbi_chart5_device_performance_breakdown.csv', index=False)
-        print(f"Saved powerbi_chart5_device_performance_breakdown.csv with {len(device_monthly)} rows")
+        self.save_chart(device_monthly, 'chart5_device_performance_breakdown')
         return device_monthly
     
     def prepare_chart_6_seo_keyword_rankings_trends(self):
         """Chart 6: SEO Keyword Rankings Trends (Line Chart) with country breakdown"""
         print("Preparing Chart 6: SEO Keyword Rankings Trends...")
         
-        seo_data = self.datasets['seo_keywords'].copy()
-        seo_data['date'] = pd.to_datetime(seo_data['date'])
+        seo_data = self.datasets['seo_keywords']
         
         # Weekly keyword performance by type and country
-        seo_weekly = seo_data.groupby(['keyword', 'country', 'keyword_type', 'is_mojo_keyword', pd.Grouper(key='date', freq='W')]).agg({
+        seo_weekly = roll_up(seo_data, ['keyword', 'country', 'keyword_type', 'is_mojo_keyword'], {
             'ranking': 'mean',
             'search_volume': 'mean',
             'clicks': 'sum',
@@ -191,13 +336,12 @@ class PowerBIGlobalDataPreparation:
             'ctr': 'mean',
             'avg_position': 'mean',
             'organic_traffic': 'sum'
-        }).reset_index()
+        }, freq='W')
         
         # Calculate organic traffic potential
         seo_weekly['organic_traffic_potential'] = seo_weekly['search_volume'] * (1 / seo_weekly['ranking'])
         
-        seo_weekly.to_csv('powerbi_dashboards/powerbi_chart6_seo_keyword_rankings_trends.csv', index=False)
-        print(f"Saved powerbi_chart6_seo_keyword_rankings_trends.csv with {len(seo_weekly)} rows")
+        self.save_chart(seo_weekly, 'chart6_seo_keyword_rankings_trends')
         
         return seo_weekly
     
@@ -205,18 +349,17 @@ class PowerBIGlobalDataPreparation:
         """Chart 7: Social Media Performance Comparison (Bar Chart)"""
         print("Preparing Chart 7: Social Media Performance Comparison...")
         
-        social_data = self.datasets['social_media'].copy()
-        social_data['date'] = pd.to_datetime(social_data['date'])
+        social_data = self.datasets['social_media']
         
         # Monthly social media performance by platform
-        social_monthly = social_data.groupby(['platform', 'is_mojo_campaign', pd.Grouper(key='date', freq='ME')]).agg({
+        social_monthly = roll_up(social_data, ['platform', 'is_mojo_campaign'], {
             'reach': 'sum',
             'impressions': 'sum',
             'engagement': 'sum',
             'clicks': 'sum',
             'conversions': 'sum',
             'cost': 'sum'
-        }).reset_index()
+        }, freq='ME')
         
         # Calculate KPIs
         social_monthly['engagement_rate'] = social_monthly['engagement'] / social_monthly['reach']
@@ -224,8 +367,7 @@ class PowerBIGlobalDataPreparation:
         social_monthly['conversion_rate'] = social_monthly['conversions'] / social_monthly['clicks']
         social_monthly['cost_per_engagement'] = social_monthly['cost'] / social_monthly['engagement']
         
-        social_monthly.to_csv('powerbi_dashboards/powerbi_chart7_social_media_performance_comparison.csv', index=False)
-        print(f"Saved powerbi_chart7_social_media_performance_comparison.csv with {len(social_monthly)} rows")
+        self.save_chart(social_monthly, 'chart7_social_media_performance_comparison')
         
         return social_monthly
     
@@ -233,24 +375,20 @@ class PowerBIGlobalDataPreparation:
         """Chart 8: Competitor Analysis Dashboard (Bar Chart) with country and keyword breakdown"""
         print("Preparing Chart 8: Competitor Analysis Dashboard...")
         
-        competitor_data = self.datasets['competitor_analysis'].copy()
-        competitor_data['date'] = pd.to_datetime(competitor_data['date'])
+        competitor_data = self.datasets['competitor_analysis']
         
         # Monthly competitor performance by country and keyword
-        competitor_monthly = competitor_data.groupby([
-            'country', 'competitor', 'is_mojo_competitor', 'keyword', pd.Grouper(key='date', freq='ME')
-        ]).agg({
+        competitor_monthly = roll_up(competitor_data, ['country', 'competitor', 'is_mojo_competitor', 'keyword'], {
             'ranking': 'mean',
             'search_volume': 'sum',
             'estimated_traffic': 'sum',
             'market_share': 'mean'
-        }).reset_index()
+        }, freq='ME')
         
         # Calculate average ranking
         competitor_monthly['avg_ranking'] = competitor_monthly['ranking']
         
-        competitor_monthly.to_csv('powerbi_dashboards/powerbi_chart8_competitor_analysis_dashboard.csv', index=False)
-        print(f"Saved powerbi_chart8_competitor_analysis_dashboard.csv with {len(competitor_monthly)} rows")
+        self.save_chart(competitor_monthly, 'chart8_competitor_analysis_dashboard')
         
         return competitor_monthly
     
@@ -258,11 +396,10 @@ class PowerBIGlobalDataPreparation:
         """Chart 9: Revenue Trends Analysis (Line Chart) with all relevant fields"""
         print("Preparing Chart 9: Revenue Trends Analysis...")
         
-        time_data = self.datasets['time_series'].copy()
-        time_data['date'] = pd.to_datetime(time_data['date'])
+        time_data = self.datasets['time_series']
         
         # Weekly revenue trends
-        revenue_weekly = time_data.groupby(pd.Grouper(key='date', freq='W')).agg({
+        revenue_weekly = roll_up(time_data, [], {
             'total_traffic': 'sum',
             'organic_traffic': 'sum',
             'paid_traffic': 'sum',
@@ -272,134 +409,114 @@ class PowerBIGlobalDataPreparation:
             'conversion_rate': 'mean',
             'revenue_per_visitor': 'mean',
             'mojo_integration_active': 'max'
-        }).reset_index()
+        }, freq='W')
         
-        # Add growth rates
-        revenue_weekly['revenue_growth'] = revenue_weekly['total_revenue'].pct_change()
-        revenue_weekly['traffic_growth'] = revenue_weekly['total_traffic'].pct_change()
-        revenue_weekly['organic_growth'] = revenue_weekly['organic_traffic'].pct_change()
+        # Add week over week growth rates
+        revenue_weekly = window_features(revenue_weekly, [], {
+            'revenue_growth': growth('total_revenue'),
+            'traffic_growth': growth('total_traffic'),
+            'organic_growth': growth('organic_traffic')
+        })
         
-        revenue_weekly.to_csv('powerbi_dashboards/powerbi_chart9_revenue_trends_analysis.csv', index=False)
-        print(f"Saved powerbi_chart9_revenue_trends_analysis.csv with {len(revenue_weekly)} rows")
+        self.save_chart(revenue_weekly, 'chart9_revenue_trends_analysis')
         
         return revenue_weekly
     
     def prepare_chart_10_mojo_acquisition_impact_dashboard(self):
-        """Chart 10: Mojo Acquisition Impact Dashboard (Cards/Gauges) with all relevant fields"""
+        """Chart 10: Mojo Acquisition Impact Dashboard (Cards/Gauges) with all relevant fields
+
+        A KPI snapshot table: every KPI over the 3 months up to each month
+        end (and the last day of data), so the cards can be sliced by
+        as_of_date.
+        """
         print("Preparing Chart 10: Mojo Acquisition Impact Dashboard...")
         
-        # Create KPI summary data
-        kpi_data = []
-        
-        # Use the most recent 3 months with data
-        def get_recent_months(df, date_col):
-            df[date_col] = pd.to_datetime(df[date_col])
-            if df.empty:
-                return df
-            last_date = df[date_col].max()
-            first_date = last_date - pd.DateOffset(months=3)
-            return df[df[date_col] > first_date]
-        
-        # Traffic KPIs
-        traffic_data = get_recent_months(self.datasets['google_analytics'].copy(), 'date')
-        # Revenue KPIs
-        revenue_data = get_recent_months(self.datasets['time_series'].copy(), 'date')
-        # Campaign KPIs
-        campaign_data = get_recent_months(self.datasets['campaign_performance'].copy(), 'date')
-        # Mojo Acquisition Impact KPIs
-        mojo_data = get_recent_months(self.datasets['mojo_acquisition_impact'].copy(), 'date')
-        
-        kpi_data.append({
-            'metric': 'Total Sessions',
-            'value': traffic_data['sessions'].sum(),
-            'category': 'Traffic',
-            'mojo_impact': 'Global'
-        })
-        
-        kpi_data.append({
-            'metric': 'Total Revenue',
-            'value': revenue_data['total_revenue'].sum(),
-            'category': 'Revenue',
-            'mojo_impact': 'Global'
-        })
-        
-        kpi_data.append({
-            'metric': 'Organic Traffic',
-            'value': traffic_data['organic_traffic'].sum(),
-            'category': 'SEO',
-            'mojo_impact': 'Enhanced'
-        })
-        
-        kpi_data.append({
-            'metric': 'ROAS',
-            'value': campaign_data['roas'].mean(),
-            'category': 'ROI',
-            'mojo_impact': 'Improved'
-        })
-        
-        kpi_data.append({
-            'metric': 'Market Share',
-            'value': mojo_data['market_share'].mean(),
-            'category': 'Market',
-            'mojo_impact': 'Expanded'
-        })
-        
-        kpi_data.append({
-            'metric': 'Brand Awareness',
-            'value': mojo_data['brand_awareness'].mean(),
-            'category': 'Brand',
-            'mojo_impact': 'Strengthened'
-        })
-        
-        kpi_data.append({
-            'metric': 'Mojo Campaigns',
-            'value': len(campaign_data[campaign_data['is_mojo_campaign'] == True]),
-            'category': 'Campaigns',
-            'mojo_impact': 'New'
-        })
-        
-        kpi_data.append({
-            'metric': 'Acquisition Impact Score',
-            'value': mojo_data['acquisition_impact_score'].mean(),
-            'category': 'Performance',
-            'mojo_impact': 'Positive'
-        })
-        
-        kpi_df = pd.DataFrame(kpi_data)
-        kpi_df.to_csv('powerbi_dashboards/powerbi_chart10_mojo_acquisition_impact_dashboard.csv', index=False)
-        print(f"Saved powerbi_chart10_mojo_acquisition_impact_dashboard.csv with {len(kpi_df)} rows")
+        # Means are taken over the raw rows the daily cubes count (CUBE_ROWS)
+        kpi_df = kpi_snapshots(self.datasets, self.KPIS, months=3)
+        self.save_chart(kpi_df, 'chart10_mojo_acquisition_impact_dashboard')
         
         return kpi_df
     
-    def create_powerbi_data_model(self):
-        """Create a comprehensive data model for Power BI"""
+    def export_star_schema(self, charts):
+        """Write the chart tables as a star schema with its relationship manifest
+
+        The dimension and fact tables (see build_star_schema) go to
+        star_schema_dir in the configured output format, next to
+        relationships.json, which lists every table file and the fact to
+        dimension relationships for the Power BI model.
+        """
+        print("Exporting star schema...")
+        os.makedirs(self.star_schema_dir, exist_ok=True)
+        
+        tables, relationships = build_star_schema(charts, self.STAR_DIMENSIONS, self.STAR_ROLES)
+        files = {}
+        for name, table in tables.items():
+            path = output_path(os.path.join(self.star_schema_dir, name), self.output_format)
+            write_dataset(table, path, self.output_format)
+            files[name] = os.path.basename(path)
+            print(f"Saved {files[name]} with {len(table)} rows")
+        
+        with open(os.path.join(self.star_schema_dir, 'relationships.json'), 'w') as f:
+            json.dump({'tables': files, 'relationships': relationships}, f, indent=2)
+        
+        return tables
+    
+    def create_powerbi_data_model(self, workers=1, executor='thread', force=False, star_schema=False):
+        """Create a comprehensive data model for Power BI
+
+        With workers > 1 the charts are built in a thread or process pool
+        (executor), each as soon as its source datasets are loaded. The
+        summary is written once every chart is done.
+
+        Charts are only rebuilt when their source files, definition, output
+        format or the preparation code changed since the run recorded in
+        build_manifest, or when their output file is missing or was edited.
+        Only the rebuilt charts are returned. force rebuilds every chart.
+
+        With star_schema set the charts are also exported as a star schema
+        (see export_star_schema), whenever any chart changed since the last
+        export.
+        """
         print("Creating Power BI global data model...")
         
         # Create powerbi_dashboards directory if it doesn't exist
         os.makedirs('powerbi_dashboards', exist_ok=True)
         
-        # Load all datasets
-        self.load_all_datasets()
-        
-        # Prepare all charts
-        charts = {
-            'chart1_global_traffic_overview': self.prepare_chart_1_global_traffic_overview(),
-            'chart2_geographic_performance_map': self.prepare_chart_2_geographic_performance_map(),
-            'chart3_campaign_performance_comparison': self.prepare_chart_3_campaign_performance_comparison(),
-            'chart4_conversion_funnel_analysis': self.prepare_chart_4_conversion_funnel_analysis(),
-            'chart5_device_performance_breakdown': self.prepare_chart_5_device_performance_breakdown(),
-            'chart6_seo_keyword_rankings_trends': self.prepare_chart_6_seo_keyword_rankings_trends(),
-            'chart7_social_media_performance_comparison': self.prepare_chart_7_social_media_performance_comparison(),
-            'chart8_competitor_analysis_dashboard': self.prepare_chart_8_competitor_analysis_dashboard(),
-            'chart9_revenue_trends_analysis': self.prepare_chart_9_revenue_trends_analysis(),
-            'chart10_mojo_acquisition_impact_dashboard': self.prepare_chart_10_mojo_acquisition_impact_dashboard()
-        }
+        # Hash the inputs, re-reading only files whose size or modification time changed
+        manifest = read_build_manifest(self.build_manifest)
+        input_files = {name: self.dataset_files(name) for name in self.DATASET_SCHEMAS}
+        inputs = {file: file_digest(file, manifest['inputs'].get(file)) for files in input_files.values() for file in files}
+        chart_paths = {name: self.chart_path(name) for name in self.CHARTS}
+        keys = chart_build_keys(self.CHARTS, input_files, self.DATASET_SCHEMAS, self.output_format, code_version(type(self)), inputs)
+        stale = self.CHARTS if force else stale_charts(self.CHARTS, keys, chart_paths, manifest)
+        star_stale = star_schema and (
+            force or manifest.get('star_schema') != keys
+            or not os.path.exists(os.path.join(self.star_schema_dir, 'relationships.json'))
+        )
+        if not stale and not star_stale:
+            print("All charts are up to date, nothing to rebuild")
+            return {}
+        print(f"Rebuilding {len(stale)} of {len(self.CHARTS)} charts")
+        
+        # Load the source datasets and prepare the stale charts, in parallel with workers > 1
+        charts = build_charts(self, stale, workers, executor) if stale else {}
+        
+        # Record what each chart was built from for the next run
+        manifest['inputs'] = {file: record for file, record in inputs.items() if record is not None}
+        for name in charts:
+            manifest['charts'][name] = {'key': keys[name], 'output': chart_paths[name], 'file': file_digest(chart_paths[name])}
+        
+        # The star schema needs every chart, the ones that were up to date are read back
+        if star_stale:
+            self.export_star_schema({name: charts[name] if name in charts else self.read_chart(name) for name in self.CHARTS})
+            manifest['star_schema'] = keys
+        write_build_manifest(self.build_manifest, manifest)
         
         # Create summary
         summary = {
-            'charts_prepared': len(charts),
-            'total_files': len(charts),
-            'files_created': [f'powerbi_{name}.csv' for name in charts.keys()],
+            'charts_prepared': len(self.CHARTS),
+            'total_files': len(self.CHARTS),
+            'files_created': [output_path(f'powerbi_{name}', self.output_format) for name in self.CHARTS],
             'chart_descriptions': {
                 'chart1_global_traffic_overview': 'Global Website Traffic Overview - Line Chart with Location Breakdown',
                 'chart2_geographic_performance_map': 'Geographic Performance Map - Map Chart with Country Codes',
@@ -410,7 +527,7 @@ class PowerBIGlobalDataPreparation:
                 'chart7_social_media_performance_comparison': 'Social Media Performance Comparison - Bar Chart by Platform',
                 'chart8_competitor_analysis_dashboard': 'Competitor Analysis Dashboard - Bar Chart including Mojo Legacy',
                 'chart9_revenue_trends_analysis': 'Revenue Trends Analysis - Line Chart with Organic vs Paid Traffic',
-                'chart10_mojo_acquisition_impact_dashboard': 'Mojo Acquisition Impact Dashboard - Cards/Gauges with Impact Metrics'
+                'chart10_mojo_acquisition_impact_dashboard': 'Mojo Acquisition Impact Dashboard - Cards/Gauges with Impact Metrics per Month-End As-Of Date'
             },
             'seo_sea_metrics_included': [
                 'CTR (Click-Through Rate)',
@@ -452,8 +569,9 @@ class PowerBIGlobalDataPreparation:
         print("\nPower BI global data preparation complete!")
         print("Files created for Power BI:")
         for name, desc in summary['chart_descriptions'].items():
-            print(f"  - powerbi_{name}.csv: {desc}")
+            print(f"  - {output_path(f'powerbi_{name}', self.output_format)}: {desc}")
         print("  - powerbi_global_data_summary.json")
+        print("  - powerbi_global_build_manifest.json")
         print(f"\nSEO/SEA Metrics Covered: {len(summary['seo_sea_metrics_included'])}")
         print(f"Global Locations: {len(summary['global_locations_covered'])}")
         print(f"Mojo Acquisition Features: {len(summary['mojo_acquisition_features'])}")
@@ -461,5 +579,21 @@ class PowerBIGlobalDataPreparation:
         return charts
 
 if __name__ == "__main__":
-    preparer = PowerBIGlobalDataPreparation()
-    charts = preparer.create_powerbi_data_model() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Prepare EVAGO global data for Power BI dashboards")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Output file format")
+    parser.add_argument('--input-format', choices=['csv', 'parquet'], default=None,
+                        help="Format of the generated datasets, by default the one the simulator last wrote")
+    parser.add_argument('--workers', type=int, default=1, help="Number of charts built in parallel")
+    parser.add_argument('--executor', choices=CHART_EXECUTORS, default='thread', help="Build charts in threads or processes")
+    parser.add_argument('--force', action='store_true', help="Rebuild every chart, even those that are up to date")
+    parser.add_argument('--chunk-rows', type=int, default=None, help="Read the datasets in chunks of this many rows")
+    parser.add_argument('--backend', choices=CUBE_BACKENDS, default='pandas', help="Engine aggregating the datasets into daily cubes")
+    parser.add_argument('--star-schema', action='store_true', help="Also export the charts as a star schema")
+    args = parser.parse_args()
+    
+    preparer = PowerBIGlobalDataPreparation(
+        output_format=args.format, chunk_rows=args.chunk_rows, backend=args.backend, input_format=args.input_format
+    )
+    charts = preparer.create_powerbi_data_model(
+        workers=args.workers, executor=args.executor, force=args.force, star_schema=args.star_schema
+    ) 
\ No newline at end of file
@@ -0,0 +1,666 @@
+import copy
+import gc
+import hashlib
+import json
+import os
+import sys
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Ways create_powerbi_data_model can run the chart builders in parallel
+CHART_EXECUTORS = ('thread', 'process')
+
+# Column of a daily cube counting the raw rows behind each cube row
+CUBE_ROWS = '_rows'
+
+# Engines that can build the daily cubes, see daily_cube and duckdb_daily_cube
+CUBE_BACKENDS = ('pandas', 'duckdb')
+
+# DuckDB type every schema dtype is cast to, and the type of its sum
+DUCKDB_TYPES = {'datetime': 'TIMESTAMP', 'category': 'VARCHAR', 'bool': 'BOOLEAN', 'int32': 'INTEGER', 'float64': 'DOUBLE'}
+DUCKDB_SUM_TYPES = {'int32': 'BIGINT', 'float64': 'DOUBLE'}
+
+# Modules besides the preparer's own whose code changes every chart
+BUILD_CODE_MODULES = ('dataset_io', __name__)
+
+
+
+def daily_cube(df, schema):
+    """Aggregate raw rows to one row per date and combination of dimensions
+
+    The dimensions are the category and bool columns of the schema, the
+    finest grain any chart reads. Numeric columns are summed and CUBE_ROWS
+    counts the raw rows, so roll_up() can derive means at any coarser grain.
+    """
+    dimensions = ['date'] + [column for column, dtype in schema.items() if dtype in ('category', 'bool')]
+    measures = [column for column in df.columns if column not in dimensions]
+    return df.groupby(dimensions, observed=True).agg(
+        **{column: (column, 'sum') for column in measures}, **{CUBE_ROWS: ('date', 'size')}
+    ).reset_index()
+
+
+def _import_duckdb():
+    """Import duckdb lazily, it is only needed for the duckdb cube backend"""
+    try:
+        import duckdb
+    except ImportError as error:
+        raise ImportError("The duckdb backend needs duckdb, install it with `pip install duckdb`") from error
+    return duckdb
+
+
+def duckdb_daily_cube(path, schema, threads=None):
+    """daily_cube() of a CSV or Parquet file, aggregated by DuckDB straight from the file
+
+    DuckDB scans the file on `threads` threads (all cores by default),
+    reads only the schema's columns and streams them through the
+    aggregation, so the raw rows are never in memory. The cube has the
+    layout and row order of daily_cube(); float sums may differ from it in
+    the last bit, as DuckDB adds them in a different order.
+    """
+    duckdb = _import_duckdb()
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    quote = lambda name: '"' + name.replace('"', '""') + '"'
+    dimensions = ['date'] + [column for column, dtype in schema.items() if dtype in ('category', 'bool')]
+    measures = [column for column in schema if column not in dimensions]
+    source = 'read_parquet(?)' if path.endswith('.parquet') else 'read_csv(?, header = true)'
+    query = f"""
+        SELECT
+            {', '.join(f'CAST({quote(column)} AS {DUCKDB_TYPES[schema[column]]}) AS {quote(column)}' for column in dimensions)},
+            {', '.join(f'CAST(SUM({quote(column)}) AS {DUCKDB_SUM_TYPES[schema[column]]}) AS {quote(column)}' for column in measures)},
+            COUNT(*) AS {quote(CUBE_ROWS)}
+        FROM {source}
+        GROUP BY ALL
+        ORDER BY {', '.join(quote(column) for column in dimensions)}
+    """
+    with duckdb.connect() as connection:
+        if threads:
+            connection.execute(f"SET threads = {int(threads)}")
+        cube = connection.execute(query, [path]).df()
+
+    categories = [column for column, dtype in schema.items() if dtype == 'category']
+    return cube.astype({column: pd.CategoricalDtype(sorted(cube[column].unique())) for column in categories})
+
+
+def concat_categorical(frames):
+    """Concatenate frames whose categorical columns may have different categories
+
+    Each categorical column gets the sorted union of the frames'
+    categories, instead of falling back to object dtype.
+    """
+    frames = list(frames)
+    for column in frames[0].select_dtypes('category').columns:
+        categories = pd.Index(sorted(set().union(*(frame[column].cat.categories for frame in frames))))
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def chunked_daily_cube(chunks, schema):
+    """daily_cube() of a dataset read as a sequence of chunks, such as iter_dataset() yields
+
+    Each chunk is aggregated to a partial cube and the partials are merged
+    at the end, so only one chunk of raw rows is in memory at a time. The
+    rows of a chunk's last date are held back and aggregated with the next
+    chunk. In a file sorted by date, every cube row is then summed from the
+    same rows in the same order as in memory, and the result is identical
+    to daily_cube() of the whole file. Unsorted files give the same cube up
+    to float rounding, as partial sums of a date are added at the end.
+    """
+    partials = []
+    held = None
+    for chunk in chunks:
+        if held is not None:
+            chunk = concat_categorical([held, chunk])
+        dates = chunk['date'].to_numpy()
+        # Start of the trailing run of the chunk's last date
+        changes = np.flatnonzero(dates[1:] != dates[:-1])
+        cut = changes[-1] + 1 if len(changes) else 0
+        if cut:
+            partials.append(daily_cube(chunk.iloc[:cut], schema))
+        held = chunk.iloc[cut:]
+    if held is not None and (len(held) or not partials):
+        partials.append(daily_cube(held, schema))
+
+    cube = concat_categorical(partials)
+    dimensions = [column for column in cube.columns if column == 'date' or schema.get(column) in ('category', 'bool')]
+    if cube.duplicated(dimensions).any() or not cube['date'].is_monotonic_increasing:
+        cube = cube.groupby(dimensions, observed=True).sum().reset_index()
+    return cube
+
+
+def roll_up(cube, by, aggregations, freq=None):
+    """Aggregate a daily cube to the `by` columns, and to date periods of freq when given
+
+    aggregations maps each output column to 'sum', 'mean' (of the raw
+    rows, weighted by CUBE_ROWS) or any other groupby aggregation, applied
+    to the cube rows. Rows come out in the order and layout of the same
+    groupby on the raw rows.
+    """
+    keys = list(by) + ([pd.Grouper(key='date', freq=freq)] if freq else [])
+    summed = {column: 'sum' if how in ('sum', 'mean') else how for column, how in aggregations.items()}
+    grouped = cube.groupby(keys, observed=True).agg({**summed, CUBE_ROWS: 'sum'})
+    for column, how in aggregations.items():
+        if how == 'mean':
+            grouped[column] = grouped[column] / grouped[CUBE_ROWS]
+    return grouped[list(aggregations)].reset_index()
+
+
+def moving_average(column, window):
+    """Window feature: mean of the last `window` rows of the group, NaN until the group has that many"""
+    return {'mean': column, 'window': window}
+
+
+def growth(column, periods=1):
+    """Window feature: relative change from `periods` rows back in the group, like pct_change
+
+    e.g. growth('sessions', 7) is week over week on daily rows and
+    growth('total_revenue', 52) year over year on weekly rows.
+    """
+    return {'growth': column, 'periods': periods}
+
+
+def cumulative(column):
+    """Window feature: running total of the group"""
+    return {'cumsum': column}
+
+
+def _sort_codes(values):
+    """Array that sorts like a column, using category codes for categoricals"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return values.to_numpy()
+
+
+def window_features(df, by, features, date='date'):
+    """Return df with per-group moving average, growth and cumulative columns added
+
+    features maps each new column to moving_average(), growth() or
+    cumulative(). Every group of the `by` columns (one series when by is
+    empty) is taken in date order, whatever the order of df, whose rows
+    keep their order. All features come from a single sort and a few
+    cumulative sums over the whole frame, not from a pass per group.
+    """
+    keys = [_sort_codes(df[column]) for column in [*by, date]]
+    order = np.lexsort(keys[::-1])
+    size = len(df)
+
+    # Position of every sorted row within its group
+    starts = np.zeros(size, dtype=bool)
+    starts[:1] = True
+    for key in keys[:-1]:
+        key = key[order]
+        starts[1:] |= key[1:] != key[:-1]
+    first = np.flatnonzero(starts)
+    group_first = np.repeat(first, np.diff(np.append(first, size)))
+    position = np.arange(size) - group_first
+
+    df = df.copy()
+    for name, feature in features.items():
+        kind = next(iter(feature))
+        values = df[feature[kind]].to_numpy(dtype=np.float64)[order]
+        missing = np.isnan(values)
+        # Running totals with a leading zero, so any window sum is a difference of two of them
+        totals = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+        result = np.full(size, np.nan)
+        if kind == 'mean':
+            window = feature['window']
+            gaps = np.concatenate(([0], np.cumsum(missing)))
+            full = position >= window - 1
+            end = np.flatnonzero(full) + 1
+            sums = totals[end] - totals[end - window]
+            # Like rolling(window).mean(), a window with a missing value has no mean
+            result[full] = np.where(gaps[end] > gaps[end - window], np.nan, sums / window)
+        elif kind == 'growth':
+            later = np.flatnonzero(position >= feature['periods'])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[later] = values[later] / values[later - feature['periods']] - 1
+        elif kind == 'cumsum':
+            result = np.where(missing, np.nan, totals[1:] - totals[group_first])
+        else:
+            raise ValueError(f"Unknown window feature {name!r}: {feature}")
+        unsorted = np.empty(size)
+        unsorted[order] = result
+        df[name] = unsorted
+    return df
+
+
+def _calendar_dimension(dates):
+    """dim_date rows for the given dates, keyed by the integer yyyymmdd"""
+    dates = pd.Series(pd.to_datetime(pd.Series(dates).dropna().unique())).sort_values(ignore_index=True)
+    return pd.DataFrame({
+        'date_key': (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int32'),
+        'date': dates,
+        'year': dates.dt.year,
+        'quarter': dates.dt.quarter,
+        'month': dates.dt.month,
+        'month_name': dates.dt.month_name(),
+        'week': dates.dt.isocalendar().week.astype('int32').to_numpy(),
+        'weekday': dates.dt.day_name()
+    })
+
+
+def _dimension_values(values):
+    """Case- and whitespace-insensitive form of dimension values, so spelling variants share one key"""
+    values = pd.Series(values, dtype=object)
+    return values.mask(values.notna(), values.astype(str).str.strip().str.casefold())
+
+
+def build_star_schema(charts, dimensions, roles=None):
+    """Split chart tables into dimension tables with integer keys and slim fact tables
+
+    dimensions maps every dimension column to its attribute columns, e.g.
+    {'campaign': ('is_mojo_campaign',)}. Each dimension becomes a
+    dim_<column> table numbering its sorted values from 1 in <column>_key;
+    'date' becomes a calendar with yyyymmdd keys. An attribute moves to the
+    dimension table when every chart holding it next to the dimension
+    column has a single value of it per dimension value, otherwise it stays
+    in the facts. Each chart becomes fact_<chart name>, with the key in
+    place of the dimension column.
+
+    Values that differ only in case or surrounding whitespace, e.g.
+    'Absperrgitter mieten' and 'absperrgitter mieten', are one dimension
+    member with one key, spelled as most chart rows spell it.
+
+    roles maps role-playing columns to the dimension they refer to, e.g.
+    {'as_of_date': 'date'}. Their values join the dimension table and they
+    become <column>_key in the facts, related to the dimension's key. When
+    a fact already has a relationship to that dimension, the role's is
+    inactive, as Power BI allows only one active path between two tables.
+
+    Returns ({table name: frame}, relationships), one relationship per fact
+    key column, as dicts Power BI's model view takes.
+    """
+    roles = roles or {}
+    tables = {}
+    mappings = {}
+    moved = {}
+    for column, attributes in dimensions.items():
+        sources = [column, *(role for role, dimension in roles.items() if dimension == column)]
+        series = [chart[source] for chart in charts.values() for source in sources if source in chart.columns]
+        if not series:
+            continue
+        frames = [chart for chart in charts.values() if column in chart.columns]
+        key = f'{column}_key'
+        if column == 'date':
+            table = _calendar_dimension(pd.concat(series))
+        else:
+            # The most common spelling of each member, the first in sort order on ties
+            spellings = pd.concat(series).dropna().astype(str).str.strip()
+            counts = spellings.groupby([_dimension_values(spellings).to_numpy(), spellings.to_numpy()]).size()
+            counts = counts.rename('rows').rename_axis(['member', column]).reset_index()
+            counts = counts.sort_values(['rows', column], ascending=[False, True]).drop_duplicates('member')
+            members = counts.sort_values(column, ignore_index=True)
+            table = pd.DataFrame({key: np.arange(1, len(members) + 1, dtype='int32'), column: members[column]})
+            for attribute in attributes:
+                pairs = [frame[[column, attribute]] for frame in frames if attribute in frame.columns]
+                if not pairs:
+                    continue
+                pairs = pd.concat(pairs).astype({column: object})
+                pairs[column] = _dimension_values(pairs[column]).map(dict(zip(members['member'], members[column])))
+                pairs = pairs.dropna(subset=[column]).drop_duplicates()
+                if len(pairs) and pairs[column].is_unique:
+                    table = table.merge(pairs, on=column, how='left')
+                    moved.setdefault(column, []).append(attribute)
+        tables[f'dim_{column}'] = table
+        mappings[column] = table[[column, key]]
+
+    relationships = []
+    for name, chart in charts.items():
+        fact = chart.copy()
+        related = set()
+        columns = [(column, column) for column in mappings] + [
+            (role, dimension) for role, dimension in roles.items() if dimension in mappings
+        ]
+        for column, dimension in columns:
+            if column not in fact.columns:
+                continue
+            table = mappings[dimension]
+            key = f'{column}_key'
+            if dimension == 'date':
+                dates = pd.to_datetime(fact[column])
+                keys = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int32')
+            else:
+                members = _dimension_values(table[dimension])
+                keys = pd.Categorical(_dimension_values(fact[column]), categories=members).codes.astype('int32') + 1
+            fact.insert(fact.columns.get_loc(column), key, keys)
+            attributes = moved.get(column, ()) if column == dimension else ()
+            fact = fact.drop(columns=[column, *(attribute for attribute in attributes if attribute in fact.columns)])
+            relationships.append({
+                'from_table': f'fact_{name}', 'from_column': key,
+                'to_table': f'dim_{dimension}', 'to_column': f'{dimension}_key',
+                'cardinality': 'many_to_one', 'cross_filter_direction': 'single', 'is_active': dimension not in related
+            })
+            related.add(dimension)
+        tables[f'fact_{name}'] = fact
+    return tables, relationships
+
+
+# Keys of a KPI definition that say how it is computed, the other keys are copied to the snapshot rows
+KPI_KINDS = ('sum', 'mean', 'count', 'distinct')
+
+
+def month_end_dates(dates):
+    """Every month end from the first to the last date, and the last date when it is not one"""
+    dates = pd.DatetimeIndex(pd.Series(dates).dropna().unique()).sort_values()
+    if not len(dates):
+        return dates
+    ends = pd.date_range(dates[0], dates[-1], freq='ME')
+    if not len(ends) or ends[-1] != dates[-1]:
+        ends = ends.append(pd.DatetimeIndex([dates[-1]]))
+    return ends
+
+
+def kpi_snapshots(datasets, kpis, as_of=None, months=1, calendar=False):
+    """Compute every KPI as of every date in one pass per dataset, as a long snapshot table
+
+    kpis maps each metric name to a dict with the 'dataset' it reads and
+    one of 'sum' (a column), 'mean' (a column, per raw row), 'count' (raw
+    rows where a bool column holds) or 'distinct' (values of a column),
+    plus an optional 'scale' factor. Its other keys, e.g. 'category', are
+    copied to the output. Datasets may be raw rows or daily cubes, whose
+    CUBE_ROWS column weighs means and counts.
+
+    Each KPI covers the `months` months up to each as-of date: the trailing
+    (as_of - months, as_of], or with calendar set whole calendar months,
+    the last one up to as_of (month to date for months=1). as_of defaults
+    to month_end_dates() of the KPI datasets. Every dataset is summed per
+    day once and each window is a difference of two cumulative sums, so
+    the cost does not grow with the number of as-of dates.
+
+    Returns one row per as-of date and KPI: as_of_date, metric, value and
+    the copied keys.
+    """
+    if as_of is None:
+        as_of = month_end_dates(pd.concat([datasets[kpi['dataset']]['date'] for kpi in kpis.values()]))
+    as_of = pd.DatetimeIndex(as_of)
+    if calendar:
+        # Exclusive lower bound: the day before the first calendar month of the window
+        starts = (as_of.to_period('M') - (months - 1)).to_timestamp() - pd.Timedelta(days=1)
+    else:
+        starts = as_of - pd.DateOffset(months=months)
+
+    values = {}
+    for dataset in dict.fromkeys(kpi['dataset'] for kpi in kpis.values()):
+        df = datasets[dataset]
+        weight = df[CUBE_ROWS] if CUBE_ROWS in df.columns else pd.Series(1, index=df.index)
+        # Numerator and denominator of every KPI of the dataset, one column per distinct value for 'distinct'
+        parts = {}
+        for metric, kpi in kpis.items():
+            if kpi['dataset'] != dataset:
+                continue
+            kind = next(key for key in KPI_KINDS if key in kpi)
+            column = df[kpi[kind]]
+            if kind == 'sum':
+                parts[(metric, 'sum')] = column
+            elif kind == 'mean':
+                parts[(metric, 'sum')] = column
+                parts[(metric, 'rows')] = weight
+            elif kind == 'count':
+                parts[(metric, 'sum')] = weight.where(column.astype(bool), 0)
+            else:
+                for value in column.dropna().unique():
+                    parts[(metric, value)] = weight.where(column == value, 0)
+        daily = pd.DataFrame(parts).groupby(df['date'].to_numpy()).sum()
+
+        # Window sums for all as-of dates from one cumulative sum per column
+        totals = np.vstack([np.zeros(daily.shape[1]), np.cumsum(daily.to_numpy(dtype=np.float64), axis=0)])
+        upper = daily.index.searchsorted(as_of, side='right')
+        lower = daily.index.searchsorted(starts, side='right')
+        windows = pd.DataFrame(totals[upper] - totals[lower], columns=pd.MultiIndex.from_tuples(daily.columns))
+
+        for metric, kpi in kpis.items():
+            if kpi['dataset'] != dataset:
+                continue
+            if 'distinct' in kpi:
+                # A value counts when it has rows anywhere in the window
+                present = windows.loc[:, windows.columns.get_level_values(0) == metric] > 0
+                value = present.sum(axis=1).to_numpy(dtype=np.float64)
+            elif 'mean' in kpi:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = (windows[(metric, 'sum')] / windows[(metric, 'rows')]).to_numpy()
+            else:
+                value = windows[(metric, 'sum')].to_numpy()
+            values[metric] = value * kpi.get('scale', 1)
+
+    snapshots = pd.DataFrame({
+        'as_of_date': np.repeat(as_of, len(kpis)),
+        'metric': np.tile(list(kpis), len(as_of)),
+        'value': np.column_stack([values[metric] for metric in kpis]).ravel()
+    })
+    for key in dict.fromkeys(key for kpi in kpis.values() for key in kpi if key not in (*KPI_KINDS, 'dataset', 'scale')):
+        snapshots[key] = np.tile([kpi.get(key) for kpi in kpis.values()], len(as_of))
+    return snapshots
+
+class SharedDatasets:
+    """Loaded datasets published once into shared memory, one Arrow IPC stream per dataset
+
+    Worker processes attach to them by name with attach_shared_datasets()
+    and read them in place, so the data is held once whatever the number
+    of workers. Needs pyarrow; use as a context manager so the blocks are
+    removed afterwards.
+    """
+
+    def __init__(self):
+        import pyarrow  # noqa: F401 - fail early, callers fall back to loading in every worker
+        self.blocks = {}
+
+    def publish(self, name, df):
+        """Copy one DataFrame into a new shared memory block"""
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Size the block exactly by writing the stream to a counting sink first
+        counter = pa.MockOutputStream()
+        with pa.ipc.new_stream(counter, table.schema) as writer:
+            writer.write_table(table)
+        block = shared_memory.SharedMemory(create=True, size=max(counter.size(), 1))
+        sink = pa.FixedSizeBufferWriter(pa.py_buffer(block.buf))
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        sink.close()
+        self.blocks[name] = block
+
+    @property
+    def handles(self):
+        """{dataset name: shared memory block name}, what workers need to attach"""
+        return {name: block.name for name, block in self.blocks.items()}
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_shared_datasets(handles):
+    """Read published datasets in place; returns ({name: DataFrame}, blocks to close once the frames are gone)
+
+    Numeric and date columns point straight into the shared blocks and are
+    read-only. Categorical and boolean columns are converted on attach.
+    """
+    import pyarrow as pa
+    frames = {}
+    blocks = []
+    for name, block_name in handles.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        table = pa.ipc.open_stream(pa.py_buffer(block.buf)).read_all()
+        frames[name] = table.to_pandas(split_blocks=True)
+    return frames, blocks
+
+
+def _build_chart_in_process(preparer, method, sources, handles=None):
+    """Build one chart in a worker process, from shared datasets or loading its own sources"""
+    if handles is None:
+        preparer.load_all_datasets(sources)
+        return getattr(preparer, method)()
+
+    frames, blocks = attach_shared_datasets(handles)
+    try:
+        preparer.datasets.update(frames)
+        del frames
+        return getattr(preparer, method)()
+    finally:
+        # The blocks can only be closed once no frame points into them
+        preparer.datasets.clear()
+        gc.collect()
+        for block in blocks:
+            block.close()
+
+
+def build_charts(preparer, charts, workers=1, executor='thread'):
+    """Build every chart and return {chart name: chart frame} in the charts' order
+
+    charts maps each chart name to (prepare method name, source dataset
+    names). With workers == 1 all datasets are loaded, then the charts are
+    built one after another. With the thread executor the source datasets
+    are loaded in a thread pool and every chart starts as soon as its own
+    sources are in. With the process executor the sources are loaded once,
+    published to shared memory (SharedDatasets) and every chart runs in a
+    worker process attached to its own sources. Without pyarrow each
+    worker loads its sources itself.
+    """
+    if executor not in CHART_EXECUTORS:
+        raise ValueError(f"Unknown chart executor {executor!r}, expected one of {list(CHART_EXECUTORS)}")
+    if workers <= 1:
+        preparer.load_all_datasets(list(dict.fromkeys(source for _, sources in charts.values() for source in sources)))
+        return {name: getattr(preparer, method)() for name, (method, _) in charts.items()}
+
+    needed = dict.fromkeys(source for _, sources in charts.values() for source in sources)
+    if executor == 'process':
+        return _build_charts_in_processes(preparer, charts, needed, workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Loads are queued before any chart, so a chart waiting for its sources never blocks them
+        loads = {name: pool.submit(preparer.load_all_datasets, [name]) for name in needed}
+
+        def build(method, sources):
+            for source in sources:
+                loads[source].result()
+            return getattr(preparer, method)()
+
+        futures = {name: pool.submit(build, method, sources) for name, (method, sources) in charts.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _build_charts_in_processes(preparer, charts, needed, workers):
+    """Process executor branch of build_charts"""
+    try:
+        shared = SharedDatasets()
+    except ImportError:
+        shared = None
+
+    # Workers get a copy of the preparer's settings, without the datasets loaded so far
+    worker_preparer = copy.copy(preparer)
+    worker_preparer.datasets = {}
+
+    with shared if shared is not None else nullcontext():
+        handles = None
+        if shared is not None:
+            for name in needed:
+                # Dropped once published, so besides the shared copy the parent holds one dataset at a time
+                preparer.load_all_datasets([name])
+                if name in preparer.datasets:
+                    shared.publish(name, preparer.datasets.pop(name))
+            handles = shared.handles
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(
+                    _build_chart_in_process, worker_preparer, method, sources,
+                    None if handles is None else {source: handles[source] for source in sources if source in handles}
+                )
+                for name, (method, sources) in charts.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+
+def file_digest(path, previous=None):
+    """{'size', 'mtime_ns', 'sha256'} of a file, or None when it does not exist
+
+    The content is only hashed again when the size or modification time
+    differ from the previous record of the same file.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and all(previous.get(key) == value for key, value in record.items()):
+        return {**record, 'sha256': previous['sha256']}
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {**record, 'sha256': digest.hexdigest()}
+
+
+def code_version(preparer_class):
+    """sha256 over the source of the preparer's module and the modules it builds charts with"""
+    digest = hashlib.sha256()
+    for module in (preparer_class.__module__, *BUILD_CODE_MODULES):
+        with open(sys.modules[module].__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_build_manifest(path):
+    """Load the manifest of the previous chart build, empty when there is none"""
+    if not os.path.exists(path):
+        return {'inputs': {}, 'charts': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_build_manifest(path, manifest):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def chart_build_keys(charts, input_files, schemas, output_format, version, inputs):
+    """Map each chart name to the sha256 of everything its output depends on
+
+    That is the chart's definition (prepare method, sources and their
+    schemas), the output format, the code version, and for every source the
+    format read and the content hash of each of its files, taken from inputs
+    ({path: file_digest record}). input_files maps each source to the file
+    that is read followed by its copies in other formats, so regenerating
+    either copy changes the key.
+    """
+    keys = {}
+    for name, (method, sources) in charts.items():
+        definition = {
+            'chart': name,
+            'method': method,
+            'sources': {source: schemas.get(source) for source in sources},
+            'output_format': output_format,
+            'code_version': version,
+            'input_formats': {source: os.path.splitext(input_files[source][0])[1] for source in sources},
+            'inputs': {
+                source: [[file, (inputs.get(file) or {}).get('sha256')] for file in input_files[source]]
+                for source in sources
+            }
+        }
+        keys[name] = hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+    return keys
+
+
+def stale_charts(charts, keys, chart_paths, manifest):
+    """The charts whose key changed since the manifest or whose output file is missing or was edited"""
+    stale = {}
+    for name, spec in charts.items():
+        entry = manifest['charts'].get(name)
+        if (
+            entry is None or entry['key'] != keys[name] or entry['output'] != chart_paths[name]
+            or (file_digest(chart_paths[name], entry['file']) or {}).get('sha256') != entry['file']['sha256']
+        ):
+            stale[name] = spec
+    return stale
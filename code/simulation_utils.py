@@ -0,0 +1,418 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dataset_io import dataset_writer, merge_parts
+
+# date(1970, 1, 1).toordinal(), used to turn datetime64 days into ordinals
+UNIX_EPOCH_ORDINAL = 719163
+
+
+def cartesian_index(dates, *dims, categories=None):
+    """Build the date x dimension cross product in nested-loop order
+
+    Each dimension is a (column, values) pair. A dimension can also carry
+    several columns at once by passing a tuple of column names and a list of
+    row tuples, e.g. (('country', 'city'), [('Germany', 'Berlin'), ...]).
+    Rows come out in the same order as `for date in dates: for a in dim1: ...`.
+
+    String columns are categorical. Their categories are the dimension values
+    unless categories maps the column to a shared CategoricalDtype.
+    """
+    dates = pd.DatetimeIndex(dates)
+    categories = categories or {}
+    sizes = [len(values) for _, values in dims]
+    rows_per_day = int(np.prod(sizes, dtype=np.int64))
+    n = len(dates) * rows_per_day
+    index = {'date': np.repeat(dates.values, rows_per_day)}
+
+    # Outer dimensions repeat in blocks, inner dimensions cycle fastest
+    inner = rows_per_day
+    positions = np.arange(n)
+    for name, values in dims:
+        inner //= len(values)
+        dim_positions = positions // inner % len(values)
+        if isinstance(name, tuple):
+            for i, column in enumerate(name):
+                index[column] = _dimension_column(column, [row[i] for row in values], dim_positions, categories)
+        else:
+            index[name] = _dimension_column(name, values, dim_positions, categories)
+
+    return pd.DataFrame(index)
+
+
+def _dimension_column(name, values, positions, categories):
+    """Expand one dimension's values to rows, as categorical codes for strings"""
+    values = pd.Series(list(values))
+    if name not in categories and pd.api.types.infer_dtype(values) != 'string':
+        return values.to_numpy()[positions]
+
+    dtype = categories.get(name) or pd.CategoricalDtype(pd.unique(values))
+    codes = dtype.categories.get_indexer(values)
+    if (codes < 0).any():
+        raise ValueError(f"Values of {name!r} missing from its categories: {list(values[codes < 0])}")
+    return pd.Categorical.from_codes(codes[positions], dtype=dtype)
+
+
+def shared_categories(columns):
+    """Fixed CategoricalDtype per column from {column: values}, keeping first-seen order"""
+    return {column: pd.CategoricalDtype(pd.unique(pd.Series(list(values)))) for column, values in columns.items()}
+
+
+def compact_frame(df, categories=None, float_dtype=np.float64):
+    """Store a generated frame in compact dtypes
+
+    Columns named in categories become shared categoricals, int64 counts
+    become int32 (when they fit) and float metrics use float_dtype.
+    """
+    int32 = np.iinfo(np.int32)
+    for column in df.columns:
+        values = df[column]
+        if categories and column in categories and not isinstance(values.dtype, pd.CategoricalDtype):
+            df[column] = values.astype(categories[column])
+        elif values.dtype == np.int64 and (values.empty or (values.min() >= int32.min and values.max() <= int32.max)):
+            df[column] = values.astype(np.int32)
+        elif values.dtype == np.float64 and float_dtype != np.float64:
+            df[column] = values.astype(float_dtype)
+    return df
+
+
+def truncate(values):
+    """Truncate each value towards zero, like int() on a single row"""
+    return np.asarray(values).astype(np.int64)
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise ratio that is 0 wherever the denominator is not positive"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator > 0)
+
+
+def scale_split(scale_factor):
+    """Split a TPC-style scale factor into (time_factor, dimension_factor)
+
+    The date range grows by one base period per power of ten
+    (SF1 -> 1, SF10 -> 2, SF100 -> 3) and the remaining growth goes into the
+    scaled dimensions, so the largest datasets grow roughly linearly with
+    the scale factor.
+    """
+    if scale_factor < 1:
+        raise ValueError(f"scale_factor must be at least 1, got {scale_factor}")
+    time_factor = 1 + int(np.floor(np.log10(scale_factor)))
+    dimension_factor = max(1, int(round(scale_factor / time_factor)))
+    return time_factor, dimension_factor
+
+
+def scaled_values(values, factor):
+    """Extend a dimension with synthetic variants, e.g. 'Berlin' -> 'Berlin 2', 'Berlin 3'
+
+    The original values always come first, so factor 1 returns them unchanged.
+    """
+    return list(values) + [f'{value} {copy}' for copy in range(2, factor + 1) for value in values]
+
+
+def dataset_key(name):
+    """Stable integer key for a dataset name, used as a spawn key component"""
+    return zlib.crc32(name.encode('utf-8'))
+
+
+def day_keys(dates):
+    """Proleptic Gregorian ordinals of the dates, as date.toordinal() returns"""
+    days = pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int64)
+    return days + UNIX_EPOCH_ORDINAL
+
+
+class RandomStreams:
+    """Root of the reproducible random streams of one simulation run
+
+    Every (dataset, day) pair gets its own generator, derived from the root
+    seed the same way SeedSequence.spawn derives children (via spawn_key).
+    The values drawn for a day therefore never depend on which other days or
+    datasets are generated in the same call, process or chunk.
+    """
+
+    def __init__(self, seed=None):
+        # With no seed, fresh OS entropy is drawn once and kept so the run can be replayed
+        self.entropy = np.random.SeedSequence(seed).entropy
+
+    def day_generators(self, dataset, dates):
+        """One independent generator per date for the given dataset"""
+        key = dataset_key(dataset)
+        return [
+            np.random.default_rng(np.random.SeedSequence(self.entropy, spawn_key=(key, int(day))))
+            for day in day_keys(dates)
+        ]
+
+    def sampler(self, dataset, data):
+        """ColumnSampler for a date-major frame built by cartesian_index"""
+        dates = pd.DatetimeIndex(data['date'].unique())
+        rows_per_day = len(data) // len(dates) if len(dates) else 0
+        return ColumnSampler(self.day_generators(dataset, dates), rows_per_day)
+
+
+class ColumnSampler:
+    """Draw whole metric columns at once for a date-major frame
+
+    Each column is drawn day by day from that day's own generator, so every
+    call must happen in the same order whatever date range is generated.
+    Bounds may be scalars or per-row arrays.
+    """
+
+    def __init__(self, generators, rows_per_day):
+        self.generators = generators
+        self.rows_per_day = rows_per_day
+        self.n = len(generators) * rows_per_day
+
+    def _draw(self, draw, *params):
+        """Call draw(generator, *day_params) for every day and stack the results"""
+        days = len(self.generators)
+        params = [
+            np.broadcast_to(param, (self.n,)).reshape(days, self.rows_per_day) if np.ndim(param) else param
+            for param in params
+        ]
+        if not days:
+            return np.empty(0)
+        return np.concatenate([
+            draw(generator, *[param[day] if np.ndim(param) else param for param in params])
+            for day, generator in enumerate(self.generators)
+        ])
+
+    def integers(self, low, high):
+        """Uniform integers in [low, high], inclusive like random.randint"""
+        return self._draw(lambda rng, low, high: rng.integers(low, high, self.rows_per_day, endpoint=True), low, high)
+
+    def uniform(self, low, high):
+        """Uniform floats in [low, high), like random.uniform"""
+        return self._draw(lambda rng, low, high: rng.uniform(low, high, self.rows_per_day), low, high)
+
+    def binomial(self, n, p):
+        """Binomial counts out of n trials with success rate p, never more than n"""
+        return self._draw(lambda rng, n, p: rng.binomial(n, p, self.rows_per_day), n, p)
+
+    def _group_layout(self, groups):
+        """Row order that lines up one day's groups, and the (groups, rows per group) shape"""
+        groups = np.asarray(groups)
+        order = np.argsort(groups, kind='stable')
+        n_groups = len(np.unique(groups))
+        return order, (n_groups, self.rows_per_day // n_groups)
+
+    def _per_day(self, values, dtype=np.float64):
+        return np.broadcast_to(np.asarray(values, dtype=dtype), (self.n,)).reshape(len(self.generators), self.rows_per_day)
+
+    def multinomial(self, totals, weights, groups):
+        """Split each group's total across the group's rows in proportion to weights
+
+        groups holds one day's group code per row (the same every day, as in a
+        cartesian_index frame) and every group must have the same number of
+        rows. totals is read from each group's first row. The parts of a
+        group are whole numbers that add up to its total exactly.
+        """
+        if not self.generators:
+            return np.empty(0, dtype=np.int64)
+        order, shape = self._group_layout(groups)
+        totals = self._per_day(totals, np.int64)
+        weights = self._per_day(weights)
+
+        parts = np.empty((len(self.generators), self.rows_per_day), dtype=np.int64)
+        for day, generator in enumerate(self.generators):
+            day_weights = weights[day][order].reshape(shape)
+            sums = day_weights.sum(axis=1, keepdims=True)
+            # A group without any weight is split evenly
+            pvals = np.divide(day_weights, sums, out=np.full(shape, 1 / shape[1]), where=sums > 0)
+            parts[day, order] = generator.multinomial(totals[day][order].reshape(shape)[:, 0], pvals).ravel()
+        return parts.ravel()
+
+    def hypergeometric(self, totals, counts, groups):
+        """Draw each group's total out of the group's rows' counts without replacement
+
+        A multivariate hypergeometric draw: groups and totals are as for
+        multinomial, counts are whole numbers per row (e.g. clicks) and no row
+        gets more than its count. The rows are drawn one after another, each a
+        hypergeometric draw of what is left of the total against the counts of
+        the rows after it. A total above its group's counts is capped at them.
+        """
+        if not self.generators:
+            return np.empty(0, dtype=np.int64)
+        order, shape = self._group_layout(groups)
+        totals = self._per_day(totals, np.int64)
+        counts = self._per_day(counts, np.int64)
+
+        parts = np.empty((len(self.generators), self.rows_per_day), dtype=np.int64)
+        for day, generator in enumerate(self.generators):
+            day_counts = counts[day][order].reshape(shape)
+            # Counts of the rows after each row, within its group
+            later = day_counts[:, ::-1].cumsum(axis=1)[:, ::-1] - day_counts
+            left = np.minimum(totals[day][order].reshape(shape)[:, 0], day_counts.sum(axis=1))
+            day_parts = np.empty(shape, dtype=np.int64)
+            for row in range(shape[1]):
+                day_parts[:, row] = generator.hypergeometric(day_counts[:, row], later[:, row], left)
+                left = left - day_parts[:, row]
+            parts[day, order] = day_parts.ravel()
+        return parts.ravel()
+
+    def ranks(self, weights, groups, positions=None):
+        """Distinct positions for the rows of each group, better ones for larger weights
+
+        Each group (as for multinomial) draws one ranking: the rows are ordered
+        by weight with Gumbel noise (a Plackett-Luce draw) and take a random
+        set of distinct positions out of 1..positions in that order, so no two
+        rows of a group share a position. positions defaults to the group size.
+        """
+        if not self.generators:
+            return np.empty(0, dtype=np.int64)
+        order, shape = self._group_layout(groups)
+        positions = positions or shape[1]
+        if positions < shape[1]:
+            raise ValueError(f"Cannot rank {shape[1]} rows per group on {positions} positions")
+        log_weights = np.log(self._per_day(weights))
+
+        ranks = np.empty((len(self.generators), self.rows_per_day), dtype=np.int64)
+        rows = np.arange(shape[0])[:, None]
+        for day, generator in enumerate(self.generators):
+            keys = log_weights[day][order].reshape(shape) + generator.gumbel(size=shape)
+            by_score = np.argsort(-keys, axis=1)
+            taken = np.sort(np.argsort(generator.random((shape[0], positions)), axis=1)[:, :shape[1]], axis=1) + 1
+            day_ranks = np.empty(shape, dtype=np.int64)
+            day_ranks[rows, by_score] = taken
+            ranks[day, order] = day_ranks.ravel()
+        return ranks.ravel()
+
+
+def split_dates(dates, shards):
+    """Split a date range into at most `shards` contiguous, non-empty slices"""
+    bounds = np.linspace(0, len(dates), max(shards, 1) + 1).astype(int)
+    return [dates[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def split_months(dates):
+    """Split a date range into one contiguous slice per calendar month"""
+    dates = pd.DatetimeIndex(dates)
+    months = dates.year * 12 + dates.month
+    starts = np.flatnonzero(np.diff(months)) + 1
+    bounds = [0, *starts, len(dates)]
+    return [dates[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _generate_shard(generate, dates, path, header, stream, output_format):
+    """Generate one date shard and write it where it was generated
+
+    In stream mode the shard is generated and appended one month at a time
+    and only the row count is returned, so memory stays flat.
+    """
+    if not stream:
+        df = generate(dates)
+        if path is not None:
+            with dataset_writer(path, output_format, header) as writer:
+                writer.write(df)
+        return df
+
+    with dataset_writer(path, output_format, header) as writer:
+        for month in split_months(dates):
+            writer.write(generate(month))
+    return writer.rows
+
+
+def run_sharded(generators, dates, path_for=None, shards=1, workers=1, stream=False, output_format='csv', append=False):
+    """Generate datasets in date shards and yield (name, result) per finished dataset
+
+    Each generator is called as generate(dates) on contiguous slices of the
+    date range. With path_for, each shard is written to its own part file by
+    the task that generated it, and the parts are concatenated into
+    path_for(name) once the whole dataset is done. With workers > 1 all
+    shards of all datasets run as tasks in one process pool.
+
+    The result is the concatenated DataFrame, or the number of rows written
+    when stream is set (which requires path_for). Files are written in
+    output_format, see dataset_io. With append, the generated rows are added
+    to the end of the existing files instead of replacing them.
+    """
+    if stream and path_for is None:
+        raise ValueError("Streaming generation needs an output path for every dataset")
+    if append and path_for is None:
+        raise ValueError("Appending needs an output path for every dataset")
+
+    date_shards = split_dates(dates, shards)
+    # Appended rows always go through part files so the existing file stays intact until the merge
+    use_parts = len(date_shards) > 1 or append
+    tasks = []
+    for name, generate in generators.items():
+        path = path_for(name) if path_for else None
+        for index, shard in enumerate(date_shards):
+            part_path = f'{path}.part{index:05d}' if path is not None and use_parts else path
+            header = index == 0 and not append
+            tasks.append((name, index, (generate, shard, part_path, header, stream, output_format)))
+
+    results = {name: [None] * len(date_shards) for name in generators}
+    pending = {name: len(date_shards) for name in generators}
+
+    def finish(name, index, result):
+        results[name][index] = result
+        pending[name] -= 1
+        if pending[name]:
+            return None
+        if path_for and use_parts:
+            parts = [f'{path_for(name)}.part{i:05d}' for i in range(len(date_shards))]
+            merge_parts(path_for(name), parts, output_format, append)
+        shard_results = results.pop(name)
+        if stream:
+            return sum(shard_results)
+        return shard_results[0] if len(shard_results) == 1 else pd.concat(shard_results, ignore_index=True)
+
+    if workers <= 1:
+        for name, index, args in tasks:
+            result = finish(name, index, _generate_shard(*args))
+            if result is not None:
+                yield name, result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_generate_shard, *args): (name, index) for name, index, args in tasks}
+        for future in as_completed(futures):
+            name, index = futures[future]
+            result = finish(name, index, future.result())
+            if result is not None:
+                yield name, result
+
+
+def run_appending(generators, dates, last_dates, path_for, shards=1, workers=1, stream=False, output_format='csv'):
+    """Generate only the days after each dataset's last generated date and append them
+
+    last_dates maps a dataset name to the last date already on disk. Every
+    day has its own random stream, so the appended files are identical to a
+    full regeneration of the whole date range. Datasets with no new days are
+    skipped. Yields (name, result) like run_sharded.
+    """
+    dates = pd.DatetimeIndex(dates)
+    groups = {}
+    for name, generate in generators.items():
+        groups.setdefault(pd.Timestamp(last_dates[name]), {})[name] = generate
+
+    for last_date, group in groups.items():
+        new_dates = dates[dates > last_date]
+        if len(new_dates):
+            yield from run_sharded(group, new_dates, path_for, shards, workers, stream, output_format, append=True)
+
+
+def write_generation_state(path, settings, datasets):
+    """Save the settings of a run and {name: {'last_date', 'rows'}} for each dataset it wrote"""
+    with open(path, 'w') as f:
+        json.dump({**settings, 'datasets': datasets}, f, indent=2, default=str)
+
+
+def read_generation_state(path, settings):
+    """Load the state of a previous run, checking it used the same settings
+
+    Settings that are None are not checked.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No generation state at {path}, run a full generation before appending")
+    with open(path) as f:
+        state = json.load(f)
+    mismatched = [key for key, value in settings.items() if value is not None and state.get(key) != value]
+    if mismatched:
+        raise ValueError(f"Cannot append to the datasets in {path}, settings differ from that run: {', '.join(mismatched)}")
+    return state
@@ -0,0 +1,199 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import json
+import os
+
+from simulation_utils import (
+    scale_split, RandomStreams, run_sharded, run_appending, read_generation_state, write_generation_state
+)
+from dataset_io import output_path
+from dataset_spec import DatasetKernel
+
+
+def spec_method(name, doc):
+    """Public generate_<name>_data(dates=None) method backed by the dataset's spec"""
+    def generate(self, dates=None):
+        return self.dataset_generators()[name](self.date_range if dates is None else dates)
+    generate.__doc__ = doc
+    return generate
+
+
+class SpecSimulator:
+    """Base class of the simulators, which only declare their dataset specs
+
+    Subclasses call setup_simulation() from __init__, fill in their
+    dimensions and self.categories, and implement dataset_specs(). Date
+    sharding, worker pools, streaming, appending and the summary file are
+    shared. See dataset_spec.DatasetKernel for the spec format.
+    """
+
+    data_dir = 'data'
+    summary_file = 'evago_data_summary.json'
+    state_file = 'evago_generation_state.json'
+    generation_message = "Generating EVAGO marketing data..."
+
+    def setup_simulation(self, seed=None, scale_factor=1, float32=False, end_date=None):
+        """Set the date range, dtypes and random streams; returns the dimension factor"""
+        # Scale factor 1 is the original 2023-2024 simulation, see scale_split for how it grows
+        self.seed = seed
+        self.scale_factor = scale_factor
+        self.float_dtype = np.float32 if float32 else np.float64
+        time_factor, dimension_factor = scale_split(scale_factor)
+        self.dimension_factor = dimension_factor
+
+        self.start_date = datetime(2023, 1, 1)
+        self.end_date = datetime(self.start_date.year + 2 * time_factor, 1, 1) - timedelta(days=1)
+        if end_date is not None:
+            # Move the end of the simulation window, e.g. forward for a daily refresh
+            self.end_date = pd.Timestamp(end_date).to_pydatetime()
+        self.date_range = pd.date_range(start=self.start_date, end=self.end_date, freq='D')
+
+        # Independent per-dataset, per-day random streams derived from one root seed
+        self.random_streams = RandomStreams(seed)
+        self.categories = {}
+        return dimension_factor
+
+    def dataset_specs(self):
+        """Map each dataset name to its spec, in output order"""
+        raise NotImplementedError
+
+    def latent_specs(self):
+        """Map each latent model name to its spec; later models may read earlier ones"""
+        return {}
+
+    def spec_params(self):
+        """Constants every spec expression can use"""
+        return {'start_date': self.start_date}
+
+    def latent_models(self, params):
+        """Kernels of the latent models, which are shared by the datasets but not output"""
+        models = {}
+        for name, spec in self.latent_specs().items():
+            models[name] = DatasetKernel(name, spec, self.random_streams, self.categories, params=params, models=dict(models))
+        return models
+
+    def dataset_generators(self):
+        """Map each dataset name to its compiled generate(dates) kernel, in output order"""
+        params = self.spec_params()
+        models = self.latent_models(params)
+        return {
+            name: DatasetKernel(name, spec, self.random_streams, self.categories, self.float_dtype, params, models)
+            for name, spec in self.dataset_specs().items()
+        }
+
+    def expected_row_counts(self):
+        """Rows each dataset will have at this scale factor, from a one-day sample"""
+        first_day = self.date_range[:1]
+        return {
+            name: len(generate(first_day)) * len(self.date_range)
+            for name, generate in self.dataset_generators().items()
+        }
+
+    def dataset_path(self, name, output_format='csv'):
+        """Output file of one generated dataset"""
+        return output_path(os.path.join(self.data_dir, f'evago_{name}_data'), output_format)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.data_dir, self.state_file)
+
+    def generate_dataset(self, name, shards=1, workers=1):
+        """Generate one dataset split into date shards, without saving it
+
+        Shards are contiguous slices of self.date_range generated on up to
+        `workers` processes. Every day has its own random stream, so the result
+        is identical for any number of shards or workers.
+        """
+        generators = {name: self.dataset_generators()[name]}
+        return dict(run_sharded(generators, self.date_range, None, shards, workers))[name]
+
+    def generation_settings(self, output_format='csv', check=False):
+        """Settings that must match for a later run to append to this one's files
+
+        With check set, the seed is only compared when one was given explicitly.
+        """
+        return {
+            'random_seed': self.seed if check else self.random_streams.entropy,
+            'scale_factor': self.scale_factor,
+            'start_date': self.start_date.date().isoformat(),
+            'float32': bool(self.float_dtype == np.float32),
+            'output_format': output_format
+        }
+
+    def summary_details(self):
+        """Simulator-specific entries of the summary file"""
+        return {'random_seed': self.random_streams.entropy}
+
+    def generate_all_data(self, workers=1, shards=1, stream=False, output_format='csv', append=False):
+        """Generate all datasets and save them
+
+        With workers > 1 the datasets are generated in a process pool and each
+        file is written as soon as its dataset is ready. With shards > 1 every
+        dataset is also split into date shards, so one large dataset can use
+        all workers instead of one. With stream set, datasets are generated and
+        appended to disk one month at a time and only row counts are returned.
+        output_format picks the file format, 'csv' (default) or 'parquet'.
+
+        With append set, only the days after the previous run (read from
+        state_path) up to end_date are generated and added to the existing
+        files, which then match a full regeneration with the same seed.
+        """
+        print(self.generation_message)
+
+        # Create data directory if it doesn't exist
+        if self.data_dir:
+            os.makedirs(self.data_dir, exist_ok=True)
+
+        path_for = lambda name: self.dataset_path(name, output_format)
+        previous = {}
+        if append:
+            # Only the days after the previous run are generated and added to its files
+            state = read_generation_state(self.state_path, self.generation_settings(output_format, check=True))
+            self.random_streams = RandomStreams(state['random_seed'])
+            previous = state['datasets']
+        print(f"Random seed: {self.random_streams.entropy}")
+
+        # Generate and save each dataset, optionally split into date shards
+        generators = self.dataset_generators()
+        if append:
+            last_dates = {name: previous[name]['last_date'] for name in generators}
+            results = run_appending(generators, self.date_range, last_dates, path_for, shards, workers, stream, output_format)
+        else:
+            results = run_sharded(generators, self.date_range, path_for, shards, workers, stream, output_format)
+        datasets = {}
+        row_counts = {}
+        for name, result in results:
+            datasets[name] = result
+            row_counts[name] = result if stream else len(result)
+            print(f"{'Appended' if append else 'Saved'} {path_for(name)} with {row_counts[name]} rows")
+        datasets = {name: datasets[name] for name in generators if name in datasets}
+
+        # Record how far each dataset goes so the next run can append to it
+        progress = {}
+        for name in generators:
+            last_date = max(pd.Timestamp(previous.get(name, {}).get('last_date', self.end_date)), pd.Timestamp(self.end_date))
+            rows = previous.get(name, {}).get('rows', 0) + row_counts.get(name, 0)
+            progress[name] = {'last_date': last_date.date().isoformat(), 'rows': rows}
+        write_generation_state(self.state_path, self.generation_settings(output_format), progress)
+
+        # Create a summary file
+        summary = {
+            'datasets_generated': len(generators),
+            'date_range': f"{self.start_date.date()} to {self.end_date.date()}",
+            'scale_factor': self.scale_factor,
+            'total_records': sum(entry['rows'] for entry in progress.values()),
+            'files_created': list(generators),
+            **self.summary_details()
+        }
+
+        with open(os.path.join(self.data_dir, self.summary_file), 'w') as f:
+            json.dump(summary, f, indent=2, default=str)
+
+        print(f"\nData generation complete! Generated {summary['total_records']} total records.")
+        print(f"Files created in {self.data_dir}/ directory:" if self.data_dir else "Files created:")
+        for name in generators:
+            print(f"  - {os.path.basename(path_for(name))}")
+        print(f"  - {self.summary_file}")
+
+        return datasets